@@ -0,0 +1,107 @@
+import argparse
+import os
+import tempfile
+
+import numpy as np
+from gensim.models import KeyedVectors
+from gensim.models.keyedvectors import Vocab
+
+from similarity import normalize_rows
+
+# number of rows normalized at once while writing the normalized matrix
+NORMALIZE_BLOCK_SIZE = 65536
+
+
+def get_vocab_path(matrix_path):
+    return os.path.splitext(matrix_path)[0] + ".vocab"
+
+
+def get_normalized_path(matrix_path):
+    return os.path.splitext(matrix_path)[0] + ".normalized.npy"
+
+
+def save_normalized(vectors, path):
+    """
+    writes the L2-normalized rows of vectors to the .npy file at path block by block, keeping their dtype;
+    the file is written under a temporary name and renamed, so concurrent readers never see a partial matrix
+    """
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(os.path.abspath(path)), suffix=".npy", delete=False) as f:
+        tmp_path = f.name
+    try:
+        normalized = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=vectors.dtype, shape=vectors.shape)
+        for start in range(0, len(vectors), NORMALIZE_BLOCK_SIZE):
+            normalized[start:start + NORMALIZE_BLOCK_SIZE] = normalize_rows(vectors[start:start + NORMALIZE_BLOCK_SIZE])
+        normalized.flush()
+        del normalized
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def convert(w2v_path, output_path, dtype="float32"):
+    """
+    converts a word2vec text file into <output_path> (.npy matrix), a .vocab file with one word per line
+    and a .normalized.npy matrix with the L2-normalized rows
+    """
+    if not output_path.endswith(".npy"):
+        raise Exception("Output path should end with .npy")
+    w2v = KeyedVectors.load_word2vec_format(w2v_path, binary=False)
+    vectors = w2v.vectors.astype(dtype)
+    np.save(output_path, vectors)
+    save_normalized(vectors, get_normalized_path(output_path))
+    with open(get_vocab_path(output_path), 'w', encoding='utf-8') as w:
+        for word in w2v.index2word:
+            w.write(f"{word}\n")
+
+
+def load_vectors(path, cls=KeyedVectors):
+    """
+    .npy files written by convert are memory-mapped read-only, so processes loading the same file share its pages;
+    anything else is read as word2vec text format
+    """
+    if not path.endswith(".npy"):
+        return cls.load_word2vec_format(path, binary=False)
+
+    vectors = np.load(path, mmap_mode='r')
+    with open(get_vocab_path(path), 'r', encoding='utf-8') as f:
+        words = f.read().split("\n")[:-1]
+    assert len(words) == vectors.shape[0]
+
+    keyed_vectors = cls(vectors.shape[1])
+    keyed_vectors.vectors = vectors
+    keyed_vectors.index2word = words
+    keyed_vectors.vocab = {word: Vocab(index=i, count=len(words) - i) for i, word in enumerate(words)}
+    return keyed_vectors
+
+
+def load_normalized(path):
+    """
+    memory-maps the L2-normalized rows of the .npy store at path, writing them first for stores converted
+    without them or changed since;
+    :return: None for word2vec text files or when the normalized matrix cannot be written next to the store
+    """
+    if not path.endswith(".npy"):
+        return None
+    normalized_path = get_normalized_path(path)
+    if not os.path.exists(normalized_path) or os.path.getmtime(normalized_path) < os.path.getmtime(path):
+        try:
+            save_normalized(np.load(path, mmap_mode='r'), normalized_path)
+        except OSError:
+            return None
+    return np.load(normalized_path, mmap_mode='r')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(prog='embedding store converter')
+    parser.add_argument('--input_path', type=str, dest="input_path", help='word2vec text vectors')
+    parser.add_argument('--output_path', type=str, dest="output_path", help='output .npy path')
+    parser.add_argument('--dtype', choices=['float32', 'float16'], default='float32')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    # --input_path "models/vectors/fasttext/ru/ruwordnet_nouns.txt"
+    # --output_path "models/vectors/fasttext/ru/ruwordnet_nouns.npy"
+    args = parse_args()
+    convert(args.input_path, args.output_path, args.dtype)
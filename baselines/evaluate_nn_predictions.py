@@ -1,9 +1,9 @@
 from collections import Counter, defaultdict
 
-from gensim.models import KeyedVectors
 from scipy import spatial
 
 from predict_models import RankedModel
+from resources import get_search, get_vectors
 from ruwordnet.ruwordnet_reader import RuWordnet
 from vectorizers.projection_vectorizer import ProjectionVectorizer
 from operator import itemgetter
@@ -13,7 +13,8 @@ class ClassifierNode2VecRankedModel(RankedModel):
     def __init__(self, params):
         super().__init__(params)
         self.params = params
-        self.node2vec = KeyedVectors.load_word2vec_format(params["node2vec_path"], binary=False)
+        self.node2vec = get_vectors(params["node2vec_path"])
+        self.node2vec_search = get_search(params["node2vec_path"], params.get("neighbour_search"))
         self.projection = ProjectionVectorizer(self.w2v_data, params["projection_path"])
         self.predicted = self.generate_predictions(params["predictions"])
 
@@ -44,7 +45,7 @@ class ClassifierNode2VecRankedModel(RankedModel):
         return [i[0] for i in sorted_hypernyms][:topn]
 
     def generate_node2vec(self, neologism, compute_hypernyms, topn=10) -> list:
-        neighbours, node2vec_vector = self.projection.predict_projection_word(neologism, self.node2vec)
+        neighbours, node2vec_vector = self.projection.predict_projection_word(neologism, self.node2vec_search)
         associates = map(itemgetter(0), neighbours)
         hchs = [hypernym for associate in associates for hypernym in compute_hypernyms(associate)]
         return hchs, node2vec_vector
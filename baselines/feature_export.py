@@ -0,0 +1,168 @@
+import argparse
+import json
+import multiprocessing
+import os
+from collections import defaultdict
+
+import numpy as np
+
+from prediction_writer import get_config_hash
+from scoring_program.utils import read_reference
+from sweep import SWEEP_KEYS
+
+MANIFEST = "manifest.json"
+# rows of other datasets can be appended to an export of the same model config; vote_params stay in the hash,
+# prepare_features applies them to the exported candidates and hyponym counts
+EXPORT_KEYS = tuple(key for key in SWEEP_KEYS if key != "vote_params") + ("test_path",)
+
+
+def extract_rows(model, neologisms, taxonomy_fns, true=None, topn=10) -> dict:
+    """
+    a row for every candidate the model ranks: neologism, candidate, label and the prepared features
+    :param true: reference hypernym groups, label is 1 for candidates in any group of the neologism;
+    the label column is left out without a reference
+    """
+    vote_params = getattr(model, "vote_params", None)
+    columns = defaultdict(list)
+    for neologism, extracted in model.iter_features(neologisms, *taxonomy_fns, topn):
+        features, ranked = model.prepare_features(extracted, vote_params)
+        keep = np.arange(len(extracted["candidates"])) if ranked is None else np.flatnonzero(ranked)
+        candidates = [extracted["candidates"][i] for i in keep.tolist()]
+        columns["neologism"].append(np.array([neologism] * len(candidates), dtype=str))
+        columns["candidate"].append(np.array(candidates, dtype=str))
+        if true is not None:
+            gold = {synset for group in true.get(neologism, []) for synset in group}
+            columns["label"].append(np.array([candidate in gold for candidate in candidates], dtype=np.int8))
+        for name, values in features.items():
+            columns[name].append(np.asarray(values)[keep])
+    return {name: np.concatenate(values) for name, values in columns.items()}
+
+
+class FeatureExport:
+    """
+    rows of extract_rows stored in a directory as chunks of .npy columns, read back memory-mapped;
+    every append adds a chunk and records it in the manifest, so exports can be extended and resumed
+    """
+    def __init__(self, path):
+        self.path = path
+        self.manifest = {"config_hash": None, "columns": None, "chunks": []}
+        if os.path.exists(os.path.join(path, MANIFEST)):
+            with open(os.path.join(path, MANIFEST), 'r', encoding='utf-8') as f:
+                self.manifest = json.load(f)
+
+    def check_config(self, config_hash):
+        if self.manifest["config_hash"] is None:
+            self.manifest["config_hash"] = config_hash
+        elif self.manifest["config_hash"] != config_hash:
+            raise Exception(f"{self.path} was exported with another config")
+
+    def append(self, columns):
+        if not len(columns.get("neologism", [])):
+            return
+        if self.manifest["columns"] is None:
+            self.manifest["columns"] = sorted(columns)
+        elif self.manifest["columns"] != sorted(columns):
+            raise Exception(f"Columns of {self.path} are {self.manifest['columns']}")
+        chunk = "chunk_{0:05d}".format(len(self.manifest["chunks"]))
+        # a chunk left by an interrupted append is not in the manifest and is overwritten
+        os.makedirs(os.path.join(self.path, chunk), exist_ok=True)
+        for name, values in columns.items():
+            np.save(os.path.join(self.path, chunk, name + ".npy"), values)
+        self.manifest["chunks"].append({"name": chunk, "rows": len(columns["neologism"])})
+        self.save_manifest()
+
+    def save_manifest(self):
+        os.makedirs(self.path, exist_ok=True)
+        manifest_path = os.path.join(self.path, MANIFEST)
+        with open(manifest_path + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, indent=1)
+        os.replace(manifest_path + ".tmp", manifest_path)
+
+    def iter_chunks(self, columns=None, mmap_mode='r'):
+        """
+        yields dict column -> array of every chunk without copying it into memory
+        """
+        for chunk in self.manifest["chunks"]:
+            yield {name: np.load(os.path.join(self.path, chunk["name"], name + ".npy"), mmap_mode=mmap_mode)
+                   for name in columns or self.manifest["columns"]}
+
+    def load(self, columns=None) -> dict:
+        """
+        :return: dict column -> rows of all chunks, a single chunk is returned memory-mapped
+        """
+        chunks = list(self.iter_chunks(columns))
+        if len(chunks) == 1:
+            return chunks[0]
+        return {name: np.concatenate([chunk[name] for chunk in chunks])
+                for name in columns or self.manifest["columns"] or []}
+
+    def exported_words(self) -> set:
+        return {word for chunk in self.iter_chunks(["neologism"]) for word in chunk["neologism"].tolist()}
+
+
+# ---------------------------------------------------------------------------------------------
+# export
+# ---------------------------------------------------------------------------------------------
+
+def init_export_worker(params, true):
+    from main import init_worker, worker_state
+    init_worker(params)
+    worker_state["true"] = true
+
+
+def export_shard(shard):
+    from main import worker_state
+    return extract_rows(worker_state["model"], shard, worker_state["taxonomy_fns"], worker_state["true"],
+                        worker_state["topn"])
+
+
+def export_features(params, output_path, true=None, n_jobs=1, chunk_size=1000):
+    """
+    appends the rows of the test words of params that are not exported yet to output_path
+    """
+    from main import MODELS, generate_taxonomy_fns, read_test_data, split_to_shards, worker_state
+    export = FeatureExport(output_path)
+    export.check_config(get_config_hash({key: value for key, value in params.items() if key not in EXPORT_KEYS}))
+    exported = export.exported_words()
+    test_data = [word for word in dict.fromkeys(read_test_data(params)) if word not in exported]
+    print(f"{len(exported)} words already exported, {len(test_data)} left")
+    export.save_manifest()
+
+    model = MODELS[params["model"]](params)
+    taxonomy_fns = generate_taxonomy_fns(params, model)
+    topn = params.get("topn", 10)
+    n_chunks = -(-len(test_data) // chunk_size)
+    shards = split_to_shards(test_data, max(n_chunks, n_jobs * 4 if n_jobs > 1 else 1))
+    if n_jobs > 1:
+        worker_state.update(model=model, taxonomy_fns=taxonomy_fns, true=true)
+        start_method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else None
+        with multiprocessing.get_context(start_method).Pool(n_jobs, initializer=init_export_worker,
+                                                            initargs=(params, true)) as pool:
+            for columns in pool.imap(export_shard, shards):
+                export.append(columns)
+    else:
+        for shard in shards:
+            export.append(extract_rows(model, shard, taxonomy_fns, true, topn))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(prog='candidate feature export')
+    parser.add_argument('--config_path', type=str, dest="config_path", help='prediction config')
+    parser.add_argument('--output_path', type=str, dest="output_path", help='export directory')
+    parser.add_argument('--gold_path', type=str, dest="gold_path", help='reference for the labels, '
+                                                                        'defaults to gold_path of the config')
+    parser.add_argument('--n_jobs', type=int, dest="n_jobs", default=1)
+    parser.add_argument('--chunk_size', type=int, dest="chunk_size", default=1000, help='words per chunk')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    # --config_path "configs/lr.json" --output_path "models/lr_features" --gold_path "data/training_nouns.tsv"
+    args = parse_args()
+    with open(args.config_path, 'r', encoding='utf-8') as j:
+        params = json.load(j)
+    gold_path = args.gold_path or params.get("gold_path")
+    if args.n_jobs > 1:
+        params.setdefault("taxonomy_backend", "memory")
+    export_features(params, args.output_path, read_reference(gold_path) if gold_path else None, args.n_jobs,
+                    args.chunk_size)
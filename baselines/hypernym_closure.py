@@ -0,0 +1,193 @@
+import argparse
+import hashlib
+import json
+from collections import Counter
+
+import numpy as np
+
+from taxonomy import TaxonomyFn, call_many
+from taxonomy_graph import build_csr
+
+# config keys that select the taxonomy a closure is built from
+TAXONOMY_KEYS = ("language", "task", "ruwordnet_path", "db_path", "taxonomy_path")
+
+
+def get_fingerprint(params, synsets):
+    """
+    md5 of the taxonomy keys of params and of the distinct synsets, saved with a closure and checked when it is loaded
+    """
+    taxonomy = {key: params[key] for key in TAXONOMY_KEYS if key in params}
+    source = json.dumps(taxonomy, sort_keys=True) + "\n" + "\n".join(sorted(set(synsets)))
+    return hashlib.md5(source.encode('utf-8')).hexdigest()
+
+
+class HypernymClosure:
+    """
+    hypernyms of a set of synsets precomputed once from a taxonomy function up to a fixed depth:
+    parent lists of every synset within depth - 1 of the sources, in the order get_hypernym_fn returns them,
+    and for every source and depth the distinct ancestors at that depth weighted by the number of paths to them
+    """
+    def __init__(self, ids, n_sources, n_expanded, depth, parents, ancestors, ancestor_weights):
+        """
+        :param ids: interned synset ids, sources first
+        :param parents: (indptr, indices) over the first n_expanded ids
+        :param ancestors: (indptr, indices), segment source * depth + d holds the ancestors at depth d + 1
+        :param ancestor_weights: number of paths for every entry of ancestors
+        """
+        self.ids = list(ids)
+        self.index = {_id: i for i, _id in enumerate(self.ids)}
+        self.n_sources = n_sources
+        self.n_expanded = n_expanded
+        self.depth = depth
+        self.parents = parents
+        self.ancestors = ancestors
+        self.ancestor_weights = ancestor_weights
+
+    # -------------------------------------------------------------
+    # build
+    # -------------------------------------------------------------
+
+    @classmethod
+    def build(cls, synsets, get_hypernym_fn, depth=2):
+        ids = list(dict.fromkeys(synsets))
+        n_sources = len(ids)
+        index = {_id: i for i, _id in enumerate(ids)}
+        levels = [0] * len(ids)
+        parents = []
+        # ids are interned in breadth-first order, so levels never decrease along them and the ids left to expand
+        # are always one level, which is looked up at once
+        while len(parents) < len(ids) and levels[len(parents)] < depth:
+            for hypernyms in call_many(get_hypernym_fn, ids[len(parents):]):
+                node = len(parents)
+                node_parents = []
+                for hypernym in hypernyms:
+                    if hypernym not in index:
+                        index[hypernym] = len(ids)
+                        ids.append(hypernym)
+                        levels.append(levels[node] + 1)
+                    node_parents.append(index[hypernym])
+                parents.append(node_parents)
+
+        ancestor_indices, ancestor_weights, ancestor_sizes = [], [], []
+        for source in range(n_sources):
+            level = {source: 1}
+            for _ in range(depth):
+                next_level = {}
+                for node, weight in level.items():
+                    for parent in parents[node]:
+                        next_level[parent] = next_level.get(parent, 0) + weight
+                ancestor_indices.extend(next_level)
+                ancestor_weights.extend(next_level.values())
+                ancestor_sizes.append(len(next_level))
+                level = next_level
+
+        parent_sources = np.repeat(np.arange(len(parents)), [len(p) for p in parents])
+        parent_targets = np.array([parent for node_parents in parents for parent in node_parents], dtype=np.int64)
+        ancestor_indptr = np.zeros(len(ancestor_sizes) + 1, dtype=np.int64)
+        np.cumsum(ancestor_sizes, out=ancestor_indptr[1:])
+        return cls(ids, n_sources, len(parents), depth,
+                   build_csr(parent_sources, parent_targets, len(parents)),
+                   (ancestor_indptr, np.array(ancestor_indices, dtype=np.int32)),
+                   np.array(ancestor_weights, dtype=np.int32))
+
+    # -------------------------------------------------------------
+    # save / load
+    # -------------------------------------------------------------
+
+    def save(self, path, fingerprint):
+        """
+        :param fingerprint: get_fingerprint of the config and synsets the closure is built for
+        """
+        np.savez(path, ids=np.array(self.ids), n_sources=self.n_sources, n_expanded=self.n_expanded, depth=self.depth,
+                 parents_indptr=self.parents[0], parents_indices=self.parents[1],
+                 ancestors_indptr=self.ancestors[0], ancestors_indices=self.ancestors[1],
+                 ancestor_weights=self.ancestor_weights, fingerprint=fingerprint)
+
+    @classmethod
+    def load(cls, path, fingerprint):
+        """
+        :param fingerprint: get_fingerprint of the config and synsets the closure is used with
+        """
+        closure = np.load(path)
+        if 'fingerprint' not in closure or str(closure['fingerprint']) != fingerprint:
+            raise Exception(f"{path} was built for another taxonomy or synset vocabulary, rebuild it with "
+                            f"hypernym_closure.py")
+        return cls(closure['ids'].tolist(), int(closure['n_sources']), int(closure['n_expanded']),
+                   int(closure['depth']), (closure['parents_indptr'], closure['parents_indices']),
+                   (closure['ancestors_indptr'], closure['ancestors_indices']), closure['ancestor_weights'])
+
+    # -------------------------------------------------------------
+    # lookups
+    # -------------------------------------------------------------
+
+    def __contains__(self, synset):
+        """
+        whether the ancestors of synset are precomputed
+        """
+        return self.index.get(synset, self.n_sources) < self.n_sources
+
+    def wrap(self, get_hypernym_fn):
+        """
+        get_hypernym_fn answered from the parent lists, synsets outside the closure are passed to get_hypernym_fn
+        """
+        indptr, indices = self.parents
+
+        def get_parents(i):
+            return [self.ids[j] for j in indices[indptr[i]:indptr[i + 1]].tolist()]
+
+        def get_hypernyms(synset):
+            i = self.index.get(synset, self.n_expanded)
+            if i >= self.n_expanded:
+                return get_hypernym_fn(synset)
+            return get_parents(i)
+
+        def get_hypernyms_many(synsets):
+            rows = [self.index.get(synset, self.n_expanded) for synset in synsets]
+            missing = [synset for synset, i in zip(synsets, rows) if i >= self.n_expanded]
+            looked_up = iter(call_many(get_hypernym_fn, missing))
+            return [next(looked_up) if i >= self.n_expanded else get_parents(i) for i in rows]
+        return TaxonomyFn(get_hypernyms, get_hypernyms_many)
+
+    def count_ancestors(self, synsets, depth=2) -> Counter:
+        """
+        same as Counter(hypernyms of synsets + hypernyms of those hypernyms + ...) up to depth
+        """
+        if depth > self.depth:
+            raise Exception(f"Closure is built up to depth {self.depth}")
+        indptr, indices = self.ancestors
+        segments = [self.index[synset] * self.depth + d for d in range(depth) for synset in synsets]
+        if not segments:
+            return Counter()
+        ancestors = np.concatenate([indices[indptr[s]:indptr[s + 1]] for s in segments])
+        weights = np.concatenate([self.ancestor_weights[indptr[s]:indptr[s + 1]] for s in segments])
+        if not len(ancestors):
+            return Counter()
+        unique, first = np.unique(ancestors, return_index=True)
+        order = unique[np.argsort(first)]
+        counts = np.bincount(ancestors, weights, minlength=len(self.ids))
+        return Counter(dict(zip([self.ids[i] for i in order.tolist()], counts[order].astype(int).tolist())))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(prog='hypernym closure builder')
+    parser.add_argument('--config_path', type=str, dest="config_path", help='prediction config')
+    parser.add_argument('--output_path', type=str, dest="output_path", help='output .npz path, '
+                                                                            'defaults to closure_path of the config')
+    parser.add_argument('--depth', type=int, dest="depth", default=2)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    # --config_path "configs/ranked.json" --output_path "models/closure/ruwordnet_nouns.npz"
+    from main import generate_taxonomy_fns
+    from predict_models import BaselineModel, get_closure_synsets
+
+    args = parse_args()
+    with open(args.config_path, 'r', encoding='utf-8') as j:
+        params = json.load(j)
+    output_path = args.output_path or params.pop("closure_path")
+    params.pop("closure_path", None)
+    model = BaselineModel(params)
+    get_hypernym_fn, _, _ = generate_taxonomy_fns(params, model)
+    synsets = get_closure_synsets(params, model.w2v_synsets)
+    HypernymClosure.build(synsets, get_hypernym_fn, args.depth).save(output_path, get_fingerprint(params, synsets))
@@ -1,6 +1,8 @@
 import sys
 import json
 import codecs
+import math
+import multiprocessing
 
 from nltk.corpus import WordNetCorpusReader
 
@@ -9,7 +11,22 @@ from ruwordnet.ruwordnet_reader import RuWordnet
 from predict_models import BaselineModel, HCHModel, RankedModel, HyponymModel, RankedWikiModel, SemevalModel, LRModel
 from predict_models import Node2vecEmbeddingsModel, Node2vecBaselineModel, Node2VecRankedModel, PoincareEmbeddingsModel
 from predict_models import CombinedModel, Node2VecModel, AllModel
+from prediction_writer import StreamingWriter
 from semeval2016_task13.semeval_taxonomy import SemEvalTaxonomy
+from scoring_program.scoring import evaluate_predictions
+from scoring_program.utils import read_dataset
+from taxonomy import TaxonomyFn, from_dict
+from wordnet_graph import get_wordnet_graph_fns
+
+MODELS = {"baseline": BaselineModel, "hch": HCHModel, "ranked": RankedModel, "hyponym": HyponymModel,
+          "wiki": RankedWikiModel, 'semeval': SemevalModel, "lr": LRModel, "node2vec": Node2vecEmbeddingsModel,
+          "node2vec_base": Node2vecBaselineModel, "node2vec_ranked": Node2VecRankedModel,
+          "neural": ClassifierNode2VecRankedModel, "poincare": PoincareEmbeddingsModel,
+          "combined": CombinedModel, "node2vec_proj": Node2VecModel, "all": AllModel}
+
+# model and taxonomy functions used by prediction workers: forked workers inherit them from the parent
+# process, spawned ones build their own in init_worker
+worker_state = {}
 
 
 def load_config():
@@ -21,27 +38,78 @@ def load_config():
 
 
 def generate_taxonomy_fns(params, model):
-    # for English WordNet
+    """
+    :return: hypernym, hyponym and name TaxonomyFn of the configured taxonomy, each callable with a single id
+    and with a list of ids through call_many
+    """
+    # for English WordNet, nltk looks synsets up one by one unless a graph of wordnet_graph.py is configured
     if params['language'] == 'en':
+        if "wordnet_graph_path" in params:
+            return get_wordnet_graph_fns(params["wordnet_graph_path"], params["synsets_vectors_path"],
+                                         params["ruwordnet_path"])
         wn = WordNetCorpusReader(params["ruwordnet_path"], None)
-        return lambda x: [hypernym.name() for hypernym in wn.synset(x).hypernyms()
-                          if hypernym.name() in model.w2v_synsets.vocab], \
-               lambda x: [hyponym.name() for hyponym in wn.synset(x).hyponyms() if hyponym.name()
-                          in model.w2v_synsets.vocab], \
-               lambda x: x.split(".")[0].replace("_", " ")
+        return TaxonomyFn(lambda x: [hypernym.name() for hypernym in wn.synset(x).hypernyms()
+                                     if hypernym.name() in model.w2v_synsets.vocab]), \
+               TaxonomyFn(lambda x: [hyponym.name() for hyponym in wn.synset(x).hyponyms() if hyponym.name()
+                                     in model.w2v_synsets.vocab]), \
+               TaxonomyFn(lambda x: x.split(".")[0].replace("_", " "))
     # for RuWordNet
     elif params['language'] == 'ru':
-        ruwordnet = RuWordnet(db_path=params["db_path"], ruwordnet_path=params["ruwordnet_path"])
-        return lambda x: ruwordnet.get_hypernyms_by_id(x), lambda x: ruwordnet.get_hyponyms_by_id(x), \
-               lambda x: ruwordnet.get_name_by_id(x)
+        # "taxonomy_backend": "memory" serves all lookups from an in-memory index instead of sqlite queries,
+        # "db_options" such as {"read_only": true, "mmap_size": 268435456} are passed to the sqlite connection
+        ruwordnet = RuWordnet(db_path=params["db_path"], ruwordnet_path=params["ruwordnet_path"],
+                              in_memory=params.get("taxonomy_backend", "sqlite") == "memory",
+                              **params.get("db_options", {}))
+        return TaxonomyFn(ruwordnet.get_hypernyms_by_id, from_dict(ruwordnet.get_hypernyms_by_ids)), \
+               TaxonomyFn(ruwordnet.get_hyponyms_by_id, from_dict(ruwordnet.get_hyponyms_by_ids)), \
+               TaxonomyFn(ruwordnet.get_name_by_id, from_dict(ruwordnet.get_names_by_ids))
     # for semeval
     elif params['task'] == 'semeval':
         taxonomy = SemEvalTaxonomy(taxonomy_path=params['taxonomy_path'], use_underscore=True)
-        return lambda x: taxonomy.get_hypernym(x), lambda x: taxonomy.get_hyponym(x), lambda x: x
+        return TaxonomyFn(taxonomy.get_hypernym, taxonomy.get_hypernyms_many), \
+               TaxonomyFn(taxonomy.get_hyponym, taxonomy.get_hyponyms_many), TaxonomyFn(lambda x: x, list)
     else:
         raise Exception("task / language is not supported")
 
 
+def uses_sqlite(params):
+    return params.get('language') == 'ru' and params.get("taxonomy_backend", "sqlite") == "sqlite"
+
+
+def init_worker(params):
+    if "model" not in worker_state:
+        model = MODELS[params["model"]](params)
+        worker_state.update(model=model, taxonomy_fns=generate_taxonomy_fns(params, model))
+    elif uses_sqlite(params):
+        # a sqlite connection must not be used across a fork, every worker opens its own
+        worker_state["taxonomy_fns"] = generate_taxonomy_fns(params, worker_state["model"])
+    worker_state["topn"] = 10 if "topn" not in params else params["topn"]
+
+
+def predict_shard(shard):
+    return worker_state["model"].predict_hypernyms(shard, *worker_state["taxonomy_fns"], worker_state["topn"])
+
+
+def split_to_shards(data, n_shards):
+    shard_size = max(1, math.ceil(len(data) / n_shards))
+    return [data[i:i + shard_size] for i in range(0, len(data), shard_size)]
+
+
+def iter_parallel(params, model, taxonomy_fns, test_data, n_jobs):
+    """
+    predicts contiguous shards of test_data in a process pool and yields (word, hypernyms) in the order of test_data
+    """
+    worker_state.update(model=model, taxonomy_fns=taxonomy_fns)
+    start_method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else None
+    with multiprocessing.get_context(start_method).Pool(n_jobs, initializer=init_worker, initargs=(params,)) as pool:
+        for shard_results in pool.imap(predict_shard, split_to_shards(test_data, n_jobs * 4)):
+            yield from shard_results.items()
+
+
+def predict_parallel(params, model, taxonomy_fns, test_data, n_jobs):
+    return dict(iter_parallel(params, model, taxonomy_fns, test_data, n_jobs))
+
+
 def save_to_file(words_with_hypernyms, output_path, params):
     # ruwordnet = RuWordnet(db_path=params["db_path"], ruwordnet_path=params["ruwordnet_path"])
     with codecs.open(output_path, 'w', encoding='utf-8') as f:
@@ -52,24 +120,59 @@ def save_to_file(words_with_hypernyms, output_path, params):
                 f.write(f"{word}\t{hypernym}\n")  # \t{ruwordnet.get_name_by_id(hypernym)}\n")
 
 
-def main():
-    models = {"baseline": BaselineModel, "hch": HCHModel, "ranked": RankedModel, "hyponym": HyponymModel,
-              "wiki": RankedWikiModel, 'semeval': SemevalModel, "lr": LRModel, "node2vec": Node2vecEmbeddingsModel,
-              "node2vec_base": Node2vecBaselineModel, "node2vec_ranked": Node2VecRankedModel,
-              "neural": ClassifierNode2VecRankedModel, "poincare": PoincareEmbeddingsModel,
-              "combined": CombinedModel, "node2vec_proj": Node2VecModel, "all": AllModel}
-    params = load_config()
+def save_streaming(params, model, taxonomy_fns, test_data, n_jobs, topn):
+    """
+    writes every word as soon as it is predicted; an interrupted run restarted with the same config
+    continues after the last written word
+    """
+    with StreamingWriter(params['output_path'], params) as writer:
+        test_data = writer.remaining(test_data)
+        print(f"{len(writer.done)} words already predicted, {len(test_data)} left")
+        if n_jobs > 1:
+            predictions = iter_parallel(params, model, taxonomy_fns, test_data, n_jobs)
+        else:
+            predictions = model.iter_hypernyms(test_data, *taxonomy_fns, topn)
+        for word, hypernyms in predictions:
+            writer.write(word, hypernyms)
+
+
+def read_test_data(params):
     with open(params['test_path'], 'r', encoding='utf-8') as f:
         if params['task'] == 'semeval':
-            test_data = [i.split("\t")[-1].replace(" ", "_") for i in f.read().split("\n") if i]
-        else:
-            test_data = f.read().split("\n")[:-1]
-    model = models[params["model"]](params)
+            return [i.split("\t")[-1].replace(" ", "_") for i in f.read().split("\n") if i]
+        return f.read().split("\n")[:-1]
+
+
+def main():
+    params = load_config()
+    n_jobs = params.get("n_jobs", 1)
+    if n_jobs > 1:
+        # workers share the taxonomy index, with "taxonomy_backend": "sqlite" each of them opens its own connection
+        params.setdefault("taxonomy_backend", "memory")
+    test_data = read_test_data(params)
+    model = MODELS[params["model"]](params)
     print("Model loaded")
 
     topn = 10 if "topn" not in params else params["topn"]
-    results = model.predict_hypernyms(list(test_data), *generate_taxonomy_fns(params, model), topn)
-    save_to_file(results, params['output_path'], params)
+    taxonomy_fns = generate_taxonomy_fns(params, model)
+    if params.get("stream", False):
+        save_streaming(params, model, taxonomy_fns, test_data, n_jobs, topn)
+        if "gold_path" not in params:
+            return
+        # resumed runs predicted only part of the words in this process
+        results = read_dataset(params['output_path'])
+    else:
+        if n_jobs > 1:
+            results = predict_parallel(params, model, taxonomy_fns, list(test_data), n_jobs)
+        else:
+            results = model.predict_hypernyms(list(test_data), *taxonomy_fns, topn)
+        # output_path can be left out when only the scores are needed
+        if "output_path" in params:
+            save_to_file(results, params['output_path'], params)
+
+    if "gold_path" in params:
+        mean_ap, mean_rr = evaluate_predictions(params["gold_path"], results)
+        print(f"map: {mean_ap}\nmrr: {mean_rr}")
 
 
 if __name__ == '__main__':
@@ -0,0 +1,193 @@
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from embedding_store import load_normalized, load_vectors
+from similarity import EmbeddingMatrix, normalize_rows
+
+# number of vectors assigned to clusters at once while building an ivf index
+ASSIGN_BLOCK_SIZE = 4096
+
+
+class ExactSearch:
+    """
+    brute-force cosine search over the whole matrix
+    """
+    def __init__(self, matrix: EmbeddingMatrix):
+        self.matrix = matrix
+
+    def similar_by_vectors(self, queries, topn=10, block_size=256) -> list:
+        return self.matrix.most_similar(queries, topn, block_size)
+
+    def similar_by_vector(self, vector, topn=10) -> list:
+        return self.similar_by_vectors(np.asarray(vector)[np.newaxis], topn)[0]
+
+
+class IVFSearch(ExactSearch):
+    """
+    inverted-file index: the normalized vectors are clustered with spherical k-means and a query scans
+    only the n_probe lists whose centroids are closest to it
+    """
+    def __init__(self, matrix: EmbeddingMatrix, n_lists=256, n_probe=8, n_iter=10, seed=0):
+        super(IVFSearch, self).__init__(matrix)
+        self.n_lists = min(n_lists, len(matrix))
+        self.n_probe = min(n_probe, self.n_lists)
+        self.n_iter = n_iter
+        self.seed = seed
+        self.centroids = None
+        self.list_offsets = None
+        self.list_items = None
+
+    # -------------------------------------------------------------
+    # build
+    # -------------------------------------------------------------
+
+    def build(self):
+        vectors = self.matrix.vectors
+        rng = np.random.RandomState(self.seed)
+        # clusters are trained in float32 whatever the dtype of the store, float16 sums lose precision and overflow
+        centroids = vectors[rng.choice(len(vectors), self.n_lists, replace=False)].astype(np.float32)
+        for _ in range(self.n_iter):
+            assignment = self.__assign(centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, vectors)
+            empty = np.bincount(assignment, minlength=self.n_lists) == 0
+            sums[empty] = centroids[empty]
+            centroids = normalize_rows(sums)
+        self.__set_lists(centroids, self.__assign(centroids))
+        return self
+
+    def __assign(self, centroids):
+        vectors = self.matrix.vectors
+        assignment = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), ASSIGN_BLOCK_SIZE):
+            assignment[start:start + ASSIGN_BLOCK_SIZE] = np.argmax(
+                vectors[start:start + ASSIGN_BLOCK_SIZE] @ centroids.T, axis=1)
+        return assignment
+
+    def __set_lists(self, centroids, assignment):
+        self.centroids = centroids
+        self.list_items = np.argsort(assignment, kind='stable').astype(np.int32)
+        self.list_offsets = np.zeros(self.n_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignment, minlength=self.n_lists), out=self.list_offsets[1:])
+
+    # -------------------------------------------------------------
+    # save / load
+    # -------------------------------------------------------------
+
+    def save(self, path, source_stamp):
+        """
+        writes the index under a temporary name and renames it, so concurrent workers never load a partial file
+        :param source_stamp: get_source_stamp of the vectors file the index is built from
+        """
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(os.path.abspath(path)), suffix=".npz",
+                                         delete=False) as f:
+            np.savez(f, centroids=self.centroids.astype(self.matrix.vectors.dtype), list_offsets=self.list_offsets,
+                     list_items=self.list_items, n_vectors=len(self.matrix), source_stamp=source_stamp)
+        os.replace(f.name, path)
+
+    def load(self, path, source_stamp):
+        index = np.load(path)
+        if int(index['n_vectors']) != len(self.matrix) or len(index['centroids']) != self.n_lists or \
+                'source_stamp' not in index or index['source_stamp'].tolist() != source_stamp:
+            raise Exception(f"{path} was built for other vectors or another number of lists")
+        self.centroids = index['centroids']
+        self.list_offsets = index['list_offsets']
+        self.list_items = index['list_items']
+        return self
+
+    # -------------------------------------------------------------
+    # search
+    # -------------------------------------------------------------
+
+    def similar_by_vectors(self, queries, topn=10, block_size=256) -> list:
+        queries = normalize_rows(queries)
+        probes = np.argsort(-(queries @ self.centroids.T), axis=1)[:, :self.n_probe]
+        result = []
+        for query, lists in zip(queries, probes):
+            candidates = np.concatenate([self.list_items[self.list_offsets[i]:self.list_offsets[i + 1]]
+                                         for i in lists])
+            scores = self.matrix.vectors[candidates] @ query
+            best = np.argsort(-scores, kind='stable')[:topn]
+            result.append([(self.matrix.words[candidates[i]], float(scores[i])) for i in best])
+        return result
+
+
+def get_index_path(vectors_path, search_params):
+    return f"{vectors_path}.{search_params['type']}{search_params.get('n_lists', 256)}.npz"
+
+
+def get_source_stamp(vectors_path) -> list:
+    """
+    size and modification time of the vectors file, an ivf index is rebuilt when they change
+    """
+    stat = os.stat(vectors_path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def build_search(matrix, vectors_path, search_params=None):
+    """
+    :param search_params: {"type": "exact"} (default) or {"type": "ivf", "n_lists": 256, "n_probe": 8};
+    ivf indices are saved next to the vectors file and reused by later runs until the vectors file changes
+    """
+    search_params = search_params or {"type": "exact"}
+    if search_params["type"] == "exact":
+        return ExactSearch(matrix)
+    elif search_params["type"] == "ivf":
+        search = IVFSearch(matrix, search_params.get("n_lists", 256), search_params.get("n_probe", 8))
+        index_path = get_index_path(vectors_path, search_params)
+        source_stamp = get_source_stamp(vectors_path)
+        if os.path.exists(index_path):
+            try:
+                return search.load(index_path, source_stamp)
+            except Exception:
+                pass
+        search.build()
+        search.save(index_path, source_stamp)
+        return search
+    else:
+        raise Exception(f"Neighbour search {search_params['type']} is not supported")
+
+
+def recall_at_k(exact, approximate, queries, k=10):
+    """
+    share of the exact top-k neighbours the approximate search also returns, averaged over queries
+    """
+    exact_neighbours = exact.similar_by_vectors(queries, k)
+    approximate_neighbours = approximate.similar_by_vectors(queries, k)
+    hits = [len(set(map(lambda x: x[0], e)) & set(map(lambda x: x[0], a))) / len(e)
+            for e, a in zip(exact_neighbours, approximate_neighbours) if e]
+    return sum(hits) / len(hits)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(prog='neighbour search recall')
+    parser.add_argument('--vectors_path', type=str, dest="vectors_path", help='indexed vectors')
+    parser.add_argument('--queries_path', type=str, dest="queries_path", help='query vectors')
+    parser.add_argument('--n_lists', type=int, dest="n_lists", default=256)
+    parser.add_argument('--n_probe', type=int, nargs='+', dest="n_probe", default=[1, 4, 8, 16, 32])
+    parser.add_argument('--k', type=int, dest="k", default=10)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    # --vectors_path "models/vectors/fasttext/ru/ruwordnet_nouns.txt"
+    # --queries_path "models/vectors/fasttext/ru/nouns_private.txt"
+    args = parse_args()
+    matrix = EmbeddingMatrix(load_vectors(args.vectors_path), load_normalized(args.vectors_path))
+    queries = load_vectors(args.queries_path).vectors
+    exact_search = ExactSearch(matrix)
+    start = time.time()
+    exact_search.similar_by_vectors(queries, args.k)
+    print(f"exact: {time.time() - start:.2f}s")
+    for n_probe in args.n_probe:
+        ivf_search = build_search(matrix, args.vectors_path, {"type": "ivf", "n_lists": args.n_lists,
+                                                              "n_probe": n_probe})
+        start = time.time()
+        ivf_search.similar_by_vectors(queries, args.k)
+        elapsed = time.time() - start
+        print(f"ivf n_lists={args.n_lists} n_probe={n_probe}: {elapsed:.2f}s, "
+              f"recall@{args.k}={recall_at_k(exact_search, ivf_search, queries, args.k):.4f}")
@@ -1,4 +1,3 @@
-import json
 import math
 import re
 from abc import abstractmethod, ABC
@@ -6,32 +5,137 @@ from collections import Counter, defaultdict
 from operator import itemgetter
 
 import numpy as np
-from gensim.models import KeyedVectors
 from gensim.models.poincare import PoincareKeyedVectors
-from scipy import spatial
 
+from hypernym_closure import get_fingerprint
+from resources import get_closure, get_matrix, get_search, get_surface_forms, get_vectors, get_wiktionary
+from similarity import rank_candidates
+from taxonomy import call_many, chain_many, get_ancestors_many
 from vectorizers.projection_vectorizer import ProjectionVectorizer
 
+# the largest number of associates any model asks generate_associates for
+ASSOCIATES_TOPN = 100
+
+
+def get_closure_synsets(params, w2v_synsets) -> list:
+    """
+    synsets hypernym_closure.py builds a closure for: the synset vectors and the node2vec vectors, if configured
+    """
+    synsets = list(w2v_synsets.index2word)
+    if "node2vec_path" in params:
+        synsets += get_vectors(params["node2vec_path"]).index2word
+    return synsets
+
 
 class Model(ABC):
+    # order of equally scored candidates in rank_features: "reversed" as rank_candidates,
+    # "most_common" as Counter.most_common
+    RANKING = "reversed"
+    # weights score_features is called with, overridden by the "weights" param
+    WEIGHTS = {}
+
     def __init__(self, params):
-        self.w2v_synsets = KeyedVectors.load_word2vec_format(params['synsets_vectors_path'], binary=False)
-        self.w2v_data = KeyedVectors.load_word2vec_format(params['data_vectors_path'], binary=False)
+        self.w2v_synsets = get_vectors(params['synsets_vectors_path'])
+        self.w2v_data = get_vectors(params['data_vectors_path'])
+        self.synsets_matrix = get_matrix(params['synsets_vectors_path'])
+        self.synsets_search = get_search(params['synsets_vectors_path'], params.get("neighbour_search"))
+        self.batch_size = params.get("batch_size")
+        # hypernym tables built by hypernym_closure.py, they replace repeated get_hypernym_fn calls
+        self.closure = None
+        if "closure_path" in params:
+            fingerprint = get_fingerprint(params, get_closure_synsets(params, self.w2v_synsets))
+            self.closure = get_closure(params["closure_path"], fingerprint)
+        self.weights = dict(self.WEIGHTS, **params.get("weights", {}))
 
     def predict_hypernyms(self, neologisms, get_hypernym_fn, get_hyponym_fn, get_taxonomy_name_fn, topn=10):
-        return {neologism: self.compute_candidates(neologism, get_hypernym_fn,
-                                                   get_hyponym_fn, get_taxonomy_name_fn,
-                                                   topn) for neologism in neologisms}
+        return dict(self.iter_hypernyms(neologisms, get_hypernym_fn, get_hyponym_fn, get_taxonomy_name_fn, topn))
+
+    def iter_hypernyms(self, neologisms, get_hypernym_fn, get_hyponym_fn, get_taxonomy_name_fn, topn=10):
+        """
+        yields (neologism, hypernyms) pairs as soon as they are computed
+        """
+        return self.iter_computed(self.compute_candidates, neologisms, get_hypernym_fn, get_hyponym_fn,
+                                  get_taxonomy_name_fn, topn)
+
+    def iter_features(self, neologisms, get_hypernym_fn, get_hyponym_fn, get_taxonomy_name_fn, topn=10):
+        """
+        yields (neologism, extract_features result) pairs
+        """
+        return self.iter_computed(self.extract_features, neologisms, get_hypernym_fn, get_hyponym_fn,
+                                  get_taxonomy_name_fn, topn)
+
+    def iter_computed(self, compute_fn, neologisms, get_hypernym_fn, get_hyponym_fn, get_taxonomy_name_fn, topn=10):
+        """
+        yields (neologism, compute_fn result) pairs; in batched mode nearest synsets are
+        precomputed for batch_size neologisms at a time
+        """
+        if self.closure is not None:
+            get_hypernym_fn = self.closure.wrap(get_hypernym_fn)
+        chunk_size = self.batch_size or len(neologisms) or 1
+        for start in range(0, len(neologisms), chunk_size):
+            chunk = neologisms[start:start + chunk_size]
+            if self.batch_size:
+                self.precompute_associates(chunk, max(topn, ASSOCIATES_TOPN))
+            for neologism in chunk:
+                yield neologism, compute_fn(neologism, get_hypernym_fn, get_hyponym_fn, get_taxonomy_name_fn, topn)
+
+    def precompute_associates(self, neologisms, topn=ASSOCIATES_TOPN):
+        pass
 
     def get_score(self, neologism, candidate, count):
         return count * self.get_similarity(neologism, candidate)
 
     def get_similarity(self, neologism, candidate):
-        v1 = self.w2v_data[neologism]
-        v2 = self.w2v_synsets[candidate]
-        v1 = v1 / (sum(v1 ** 2) ** 0.5)
-        v2 = v2 / (sum(v2 ** 2) ** 0.5)
-        return 1 - spatial.distance.cosine(v1, v2)
+        return float(self.get_similarities(neologism, [candidate])[0])
+
+    def get_similarities(self, neologism, candidates):
+        return self.synsets_matrix.similarities(self.w2v_data[neologism], candidates)
+
+    def count_hypernyms(self, synsets, get_hypernym_fn) -> Counter:
+        """
+        Counter of the hypernyms of synsets followed by the hypernyms of those hypernyms
+        """
+        if self.closure is not None and all(synset in self.closure for synset in synsets):
+            return self.closure.count_ancestors(synsets, 2)
+        ancestors = get_ancestors_many(get_hypernym_fn, synsets, 2)
+        hypernyms = [hypernym for first_order, _ in ancestors for hypernym in first_order]
+        second_order_hypernyms = [s_o for _, second_order in ancestors for s_o in second_order]
+        return Counter(hypernyms + second_order_hypernyms)
+
+    def rank_by_similarity(self, neologism, counts: Counter) -> list:
+        candidates = list(counts)
+        scores = np.array(list(counts.values()), dtype=float) * self.get_similarities(neologism, candidates)
+        return rank_candidates(candidates, scores)
+
+    def extract_features(self, neologism, get_hypernym_fn, get_hyponym_fn, get_taxonomy_name_fn, topn=10) -> dict:
+        """
+        candidates of neologism with the raw features score_features combines, computed once so that
+        other weights can be tried without generating the candidates again (see sweep.py)
+        :return: {"candidates": list, "features": dict name -> array over the candidates, ...}
+        """
+        raise Exception(f"{type(self).__name__} does not support feature extraction")
+
+    @classmethod
+    def prepare_features(cls, extracted, vote_params=None):
+        """
+        :return: features to score and the mask of candidates that are ranked, None if all of them are
+        """
+        return extracted["features"], None
+
+    @staticmethod
+    def score_features(features, weights):
+        raise Exception("Features can not be scored")
+
+    def rank_features(self, extracted, weights, vote_params=None, topn=10) -> list:
+        features, ranked = self.prepare_features(extracted, vote_params)
+        scores = self.score_features(features, weights)
+        candidates = extracted["candidates"]
+        if ranked is not None:
+            candidates = [candidates[i] for i in np.flatnonzero(ranked).tolist()]
+            scores = scores[ranked]
+        if self.RANKING == "most_common":
+            return top_votes(candidates, scores, topn)
+        return rank_candidates(candidates, scores)[:topn]
 
     @abstractmethod
     def compute_candidates(self, neologisms, get_hypernym_fn, get_hyponym_fn, get_taxonomy_name_fn, topn=10):
@@ -45,12 +149,20 @@ class Model(ABC):
 class BaselineModel(Model):
     def __init__(self, params):
         super().__init__(params)
+        self.associates = {}
 
     def compute_candidates(self, neologism, get_hypernym_fn, get_hyponym_fn, get_taxonomy_name_fn, topn=10) -> list:
         return list(map(itemgetter(0), self.generate_associates(neologism, topn)))
 
+    def precompute_associates(self, neologisms, topn=ASSOCIATES_TOPN):
+        queries = np.array([self.w2v_data[neologism] for neologism in neologisms])
+        neighbours = self.synsets_search.similar_by_vectors(queries, topn, self.batch_size)
+        self.associates = dict(zip(neologisms, neighbours))
+
     def generate_associates(self, neologism, topn=10) -> list:
-        return self.w2v_synsets.similar_by_vector(self.w2v_data[neologism], topn)
+        if len(self.associates.get(neologism, [])) >= topn:
+            return self.associates[neologism][:topn]
+        return self.synsets_search.similar_by_vector(self.w2v_data[neologism], topn)
 
 
 # ---------------------------------------------------------------------------------------------
@@ -66,9 +178,13 @@ class HCHModel(BaselineModel):
 
     def compute_hchs(self, neologism, compute_hypernyms, topn=10) -> list:
         associates = map(itemgetter(0), self.generate_associates(neologism, topn))
-        hchs = [hypernym for associate in associates for hypernym in compute_hypernyms(associate)]
+        hchs = chain_many(compute_hypernyms, associates)
         return hchs
 
+    def count_hchs(self, neologism, compute_hypernyms, topn=10) -> Counter:
+        associates = list(map(itemgetter(0), self.generate_associates(neologism, topn)))
+        return self.count_hypernyms(associates, compute_hypernyms)
+
 
 # ---------------------------------------------------------------------------------------------
 # Ranked Model
@@ -79,13 +195,8 @@ class RankedModel(HCHModel):
         super().__init__(params)
 
     def compute_candidates(self, neologism, get_hypernym_fn, get_hyponym_fn, get_taxonomy_name_fn, topn=10):
-        hypernyms = self.compute_hchs(neologism, get_hypernym_fn, topn)
-        second_order_hypernyms = [s_o for hypernym in hypernyms for s_o in get_hypernym_fn(hypernym)]
-
-        all_hypernyms = Counter(hypernyms + second_order_hypernyms)
-        sorted_hypernyms = reversed(sorted(all_hypernyms.items(), key=lambda x: self.get_score(neologism, *x)))
-
-        return [i[0] for i in sorted_hypernyms][:topn]
+        all_hypernyms = self.count_hchs(neologism, get_hypernym_fn, topn)
+        return self.rank_by_similarity(neologism, all_hypernyms)[:topn]
 
 
 # ---------------------------------------------------------------------------------------------
@@ -102,20 +213,122 @@ def compute_distance(s):
     return np.sqrt(2 * (1 - s))
 
 
+def get_vote_edges(associates, get_hypernym_fn):
+    """
+    hypernyms and second-order hypernyms of the associates in the order the voting visits them
+    :return: (candidates in order of first appearance, candidate slot, associate index and second-order flag of
+    every edge)
+    """
+    slots = {}
+    edges = []
+    # hypernyms of all associates and then of all their hypernyms, two lookups of the taxonomy in total
+    associate_hypernyms = call_many(get_hypernym_fn, associates)
+    hypernyms = list(dict.fromkeys(hypernym for hypernyms in associate_hypernyms for hypernym in hypernyms))
+    second_order_hypernyms = dict(zip(hypernyms, call_many(get_hypernym_fn, hypernyms)))
+    for i, hypernyms in enumerate(associate_hypernyms):
+        for hypernym in hypernyms:
+            edges.append((slots.setdefault(hypernym, len(slots)), i, False))
+            for second_order in second_order_hypernyms[hypernym]:
+                edges.append((slots.setdefault(second_order, len(slots)), i, True))
+    edges = np.array(edges, dtype=np.int64).reshape(-1, 3)
+    return list(slots), edges[:, 0], edges[:, 1], edges[:, 2].astype(bool)
+
+
+def vote(similarities, edges, a=3.0, b=5.0, y=0.5):
+    """
+    every edge votes distance2vote of its associate's distance for its candidate, second-order edges are
+    weighted by y; votes of a candidate are summed in edge order, as Counter would do
+    :return: (candidates, votes) in order of first appearance
+    """
+    candidates, slots, sources, second_order = edges
+    distances = compute_distance(np.asarray(similarities, dtype=float))
+    votes = np.where(second_order, distance2vote(distances, a, b, y)[sources], distance2vote(distances, a, b)[sources])
+    return candidates, np.bincount(slots, votes, minlength=len(candidates))
+
+
+def top_votes(candidates, votes, topn=10) -> list:
+    """
+    same order as Counter(zip(candidates, votes)).most_common(topn)
+    """
+    return [candidates[i] for i in np.argsort(-votes, kind='stable')[:topn]]
+
+
+def clean_wiki_hypernyms(wiki_hypernyms, pattern) -> list:
+    cleaned = []
+    for wiki_hypernym in wiki_hypernyms:
+        wiki_hypernym = wiki_hypernym.replace("|", " ").replace('--', '')
+        wiki_hypernym = pattern.sub("", wiki_hypernym)
+        if not all([i == " " for i in wiki_hypernym]):
+            cleaned.append(wiki_hypernym.replace(" ", "_"))
+    return cleaned
+
+
+def get_definition_words(wiktionary, surface_forms, neologism, candidates, get_taxonomy_name_fn) -> set:
+    """
+    name words of the candidates that occur in the wiktionary meanings of neologism, matched in one pass
+    """
+    if neologism.lower() not in wiktionary:
+        return set()
+    candidates = list(candidates)
+    surface_forms.add_names(candidates, get_taxonomy_name_fn)
+    words = {word for candidate in candidates
+             for word in surface_forms.get_name_words(candidate, get_taxonomy_name_fn)}
+    return wiktionary[neologism.lower()].find_in_meanings(words)
+
+
+def get_wiki_counts(wiktionary, surface_forms, neologism, get_taxonomy_fn, candidate, definition_words=None) -> tuple:
+    """
+    :return: synonym_count, definition_count and wiki_count features, raised to 2 when a name word of
+    candidate is a wiktionary synonym of neologism, occurs in its meanings, or is its wiktionary hypernym
+    """
+    wiki_count = 0.3
+    definition_count = 0.8
+    synonym_count = 1
+
+    if neologism.lower() in wiktionary:
+        wiktionary_data = wiktionary[neologism.lower()]
+        candidate_words = surface_forms.get_name_words(candidate, get_taxonomy_fn)
+
+        if any([wiktionary_data.has_hypernym(candidate_word) for candidate_word in candidate_words]):
+            wiki_count = 2
+
+        if definition_words is None:
+            definition_words = wiktionary_data.find_in_meanings(candidate_words)
+        if any([candidate_word in definition_words for candidate_word in candidate_words]):
+            definition_count = 2
+
+        if any([wiktionary_data.has_synonym(candidate_word) for candidate_word in candidate_words]):
+            synonym_count = 2
+    return synonym_count, definition_count, wiki_count
+
+
+def get_wiki_count_features(wiktionary, surface_forms, neologism, candidates, get_taxonomy_name_fn) -> dict:
+    definition_words = get_definition_words(wiktionary, surface_forms, neologism, candidates, get_taxonomy_name_fn)
+    counts = np.array([get_wiki_counts(wiktionary, surface_forms, neologism, get_taxonomy_name_fn, candidate,
+                                       definition_words) for candidate in candidates], dtype=float).reshape(-1, 3)
+    return {"synonym_count": counts[:, 0], "definition_count": counts[:, 1], "wiki_count": counts[:, 2]}
+
+
+def count_votes(associates, get_hypernym_fn) -> Counter:
+    votes = Counter()
+    associates = list(associates)
+    for (_, similarity), hypernyms in zip(associates, call_many(get_hypernym_fn, map(itemgetter(0), associates))):
+        for hypernym in hypernyms:
+            votes[hypernym] += similarity
+    return votes
+
+
 class HyponymModel(HCHModel):
     def __init__(self, params):
         super().__init__(params)
+        # a, b and y of vote
+        self.vote_params = params.get("vote_params", {})
 
     def compute_candidates(self, neologism, get_hypernym_fn, get_hyponym_fn, get_taxonomy_name_fn, topn=10):
         associates = self.generate_associates(neologism, 100)
-        votes = Counter()
-        for associate, similarity in associates:
-            distance = compute_distance(similarity)
-            for hypernym in get_hypernym_fn(associate):
-                votes[hypernym] += distance2vote(distance)
-                for second_order in get_hypernym_fn(hypernym):
-                    votes[second_order] += distance2vote(distance, y=0.5)
-        return list(map(itemgetter(0), votes.most_common(topn)))
+        edges = get_vote_edges(list(map(itemgetter(0), associates)), get_hypernym_fn)
+        candidates, votes = vote(list(map(itemgetter(1), associates)), edges, **self.vote_params)
+        return top_votes(candidates, votes, topn)
 
 
 # ---------------------------------------------------------------------------------------------
@@ -126,75 +339,44 @@ class HyponymModel(HCHModel):
 class SemevalModel(HCHModel):
     def __init__(self, params):
         super().__init__(params)
-        self.wiktionary = self.__get_wiktionary(params['wiki_path'])
-        self.wiki_model = KeyedVectors.load_word2vec_format(params['wiki_vectors_path'], binary=False)
-        self.delete_bracets = re.compile(r"\(.+?\)")
+        self.wiktionary = get_wiktionary(params['wiki_path'])
+        self.wiki_model = get_vectors(params['wiki_vectors_path'])
+        self.surface_forms = get_surface_forms(params)
         if params['language'] == 'ru':
             self.pattern = re.compile("[^А-я \-]")
         else:
             self.pattern = re.compile("[^A-z \-]")
 
-    def __get_wiktionary(self, path):
-        wiktionary = {}
-        with open(path, 'r') as f:
-            for line in f:
-                data = json.loads(line)
-                wiktionary[data['word']] = {"hypernyms": data['hypernyms'], "synonyms": data['synonyms'],
-                                            "meanings": data['meanings']}
-        return wiktionary
+    WEIGHTS = {"synonym_count": 2, "definition_count": 0.8, "wiki_count": 0.5, "wiki_similarity": 2,
+               "count_similarity": 0.6}
 
     def compute_candidates(self, neologism, get_hypernym_fn, get_hyponym_fn, get_taxonomy_name_fn, topn=10):
+        extracted = self.extract_features(neologism, get_hypernym_fn, get_hyponym_fn, get_taxonomy_name_fn, topn)
+        return self.rank_features(extracted, self.weights, topn=topn)
+
+    def extract_features(self, neologism, get_hypernym_fn, get_hyponym_fn, get_taxonomy_name_fn, topn=10) -> dict:
         hypernyms = self.compute_hchs(neologism, get_hypernym_fn, topn)
         all_hypernyms = Counter(hypernyms)
-        associates = self.generate_associates(neologism, 50)
-        votes = Counter()
-        for associate, similarity in associates:
-            for hypernym in get_hypernym_fn(associate):
-                votes[hypernym] += similarity
-        sorted_hypernyms = reversed(sorted((all_hypernyms + votes).items(),
-                                           key=lambda x: self.get_wiki_score(neologism, get_taxonomy_name_fn, *x)
-                                           ))
-        return [i[0] for i in sorted_hypernyms][:topn]
-
-    def get_wiki_score(self, neologism, get_taxonomy_fn, candidate, count):
-        wiki_count = 0.3
-        definition_count = 0.8
-        synonym_count = 1
-        wiki_similarity = 1
-        if neologism.lower() in self.wiktionary:
-            wiktionary_data = self.wiktionary[neologism.lower()]
-            candidate_words = self.delete_bracets.sub("", get_taxonomy_fn(candidate)).split(',')
-
-            if any([candidate_word.lower() in wiktionary_data['hypernyms'] for candidate_word in candidate_words]):
-                wiki_count = 2
-
-            if any([any([candidate_word.lower() in i for candidate_word in candidate_words])
-                    for i in wiktionary_data['meanings']]):
-                definition_count = 2
-
-            if any([candidate_word.lower() in wiktionary_data['synonyms'] for candidate_word in candidate_words]):
-                synonym_count = 2
-
-            wiki_similarities = []
-            # for wiki_hypernym in wiktionary_data['hypernyms']:
-            #     wiki_hypernym = wiki_hypernym.replace("|", " ").replace('--', '')
-            #     wiki_hypernym = self.pattern.sub("", wiki_hypernym)
-            #     if not all([i == " " for i in wiki_hypernym]):
-            #         wiki_similarities.append(self.compute_similarity(wiki_hypernym.replace(" ", "_"), candidate))
-            if wiki_similarities:
-                wiki_similarity = sum(wiki_similarities) / len(wiki_similarities)
-
-        return synonym_count * 2 + definition_count * 0.8 + wiki_count * 0.5 + 0.6 * count * self.get_similarity(
-            neologism,
-            candidate) + 2 * wiki_similarity
-        # return synonym_count * 0.5 + definition_count * 0.4 + wiki_count * 0.3 + 0.6 * count * self.get_similarity(neologism, candidate) + 2*wiki_similarity
+        votes = count_votes(self.generate_associates(neologism, 50), get_hypernym_fn)
+        all_candidates = all_hypernyms + votes
+        candidates = list(all_candidates)
+        features = get_wiki_count_features(self.wiktionary, self.surface_forms, neologism, candidates,
+                                           get_taxonomy_name_fn)
+        # wiki similarities of the wiktionary hypernyms are not used by this model
+        features["wiki_similarity"] = np.ones(len(candidates))
+        features["count"] = np.array(list(all_candidates.values()), dtype=float)
+        features["similarity"] = self.get_similarities(neologism, candidates)
+        return {"candidates": candidates, "features": features}
+
+    @staticmethod
+    def score_features(features, weights):
+        scores = features["synonym_count"] * weights["synonym_count"] + \
+                 features["definition_count"] * weights["definition_count"] + \
+                 features["wiki_count"] * weights["wiki_count"] + weights["wiki_similarity"] * features["wiki_similarity"]
+        return scores + weights["count_similarity"] * features["count"] * features["similarity"]
 
     def compute_similarity(self, neologism, candidate):
-        v1 = self.wiki_model[neologism]
-        v2 = self.w2v_synsets[candidate]
-        v1 = v1 / (sum(v1 ** 2) ** 0.5)
-        v2 = v2 / (sum(v2 ** 2) ** 0.5)
-        return 1 - spatial.distance.cosine(v1, v2)
+        return float(self.synsets_matrix.similarities(self.wiki_model[neologism], [candidate])[0])
 
 
 # ---------------------------------------------------------------------------------------------
@@ -205,103 +387,75 @@ class SemevalModel(HCHModel):
 class RankedWikiModel(HCHModel):
     def __init__(self, params):
         super().__init__(params)
-        self.wiktionary = self.__get_wiktionary(params['wiki_path'])
-        self.wiki_model = KeyedVectors.load_word2vec_format(params['wiki_vectors_path'], binary=False)
-        self.node2vec = KeyedVectors.load_word2vec_format(params["node2vec_path"], binary=False)
+        self.wiktionary = get_wiktionary(params['wiki_path'])
+        self.wiki_model = get_vectors(params['wiki_vectors_path'])
+        self.node2vec = get_vectors(params["node2vec_path"])
+        self.wiki_matrix = get_matrix(params['wiki_vectors_path'])
+        self.node2vec_matrix = get_matrix(params["node2vec_path"])
+        self.node2vec_search = get_search(params["node2vec_path"], params.get("neighbour_search"))
         self.n = params['n']
         self.projection = ProjectionVectorizer(self.w2v_data, params["projection_path"])
 
-        self.delete_bracets = re.compile(r"\(.+?\)")
+        self.surface_forms = get_surface_forms(params)
         if params['language'] == 'ru':
             self.pattern = re.compile("[^А-я \-]")
         else:
             self.pattern = re.compile("[^A-z \-]")
 
-    def __get_wiktionary(self, path):
-        wiktionary = {}
-        with open(path, 'r') as f:
-            for line in f:
-                data = json.loads(line)
-                wiktionary[data['word']] = {"hypernyms": data['hypernyms'], "synonyms": data['synonyms'],
-                                            "meanings": data['meanings']}
-        return wiktionary
+    WEIGHTS = {"synonym_count": 2, "definition_count": 0.4, "wiki_count": 0.3, "count_similarity": 0.6,
+               "wiki_similarity": 2, "node2vec_similarity": 2}
 
     def compute_candidates(self, neologism, get_hypernym_fn, get_hyponym_fn, get_taxonomy_name_fn, topn=10):
-        hypernyms = self.compute_hchs(neologism, get_hypernym_fn, topn)
-        second_order_hypernyms = [s_o for hypernym in hypernyms for s_o in get_hypernym_fn(hypernym)]
-        all_hypernyms = Counter(hypernyms + second_order_hypernyms)
+        extracted = self.extract_features(neologism, get_hypernym_fn, get_hyponym_fn, get_taxonomy_name_fn, topn)
+        return self.rank_features(extracted, self.weights, topn=topn)
+
+    def extract_features(self, neologism, get_hypernym_fn, get_hyponym_fn, get_taxonomy_name_fn, topn=10) -> dict:
+        all_hypernyms = self.count_hchs(neologism, get_hypernym_fn, topn)
         associates = self.generate_associates(neologism, 50)
 
         node2vec, mean_node2vec = self.generate_node2vec(neologism, get_hypernym_fn, topn)
 
-        votes = Counter()
-        for associate, similarity in associates:
-            for hypernym in get_hypernym_fn(associate):
-                votes[hypernym] += similarity
-        sorted_hypernyms = reversed(sorted((all_hypernyms + votes).items(),
-                                           key=lambda x: self.get_wiki_score(neologism, get_taxonomy_name_fn, mean_node2vec,
-                                                                             *x)
-                                           ))
-        return [i[0] for i in sorted_hypernyms][:topn]
-
-    def get_wiki_score(self, neologism, get_taxonomy_fn, node2vec_vector, candidate, count):
-        wiki_count = 0.3
-        definition_count = 0.8
-        synonym_count = 1
-        wiki_similarity = 1
-        node2vec_count = 1
-
+        all_candidates = all_hypernyms + count_votes(associates, get_hypernym_fn)
+        candidates = list(all_candidates)
+        features = get_wiki_count_features(self.wiktionary, self.surface_forms, neologism, candidates,
+                                           get_taxonomy_name_fn)
+        features["count"] = np.array(list(all_candidates.values()), dtype=float)
+        features["similarity"] = self.get_similarities(neologism, candidates)
+        features["wiki_similarity"] = self.get_wiki_similarities(neologism, candidates)
+        features["node2vec_similarity"] = self.node2vec_matrix.similarities(mean_node2vec, candidates)
+        return {"candidates": candidates, "features": features}
+
+    @staticmethod
+    def score_features(features, weights):
+        scores = features["synonym_count"] * weights["synonym_count"] + \
+                 features["definition_count"] * weights["definition_count"] + \
+                 features["wiki_count"] * weights["wiki_count"]
+        return scores + weights["count_similarity"] * features["count"] * features["similarity"] + \
+               weights["wiki_similarity"] * features["wiki_similarity"] + \
+               weights["node2vec_similarity"] * features["node2vec_similarity"]
+
+    def get_wiki_similarities(self, neologism, candidates):
+        wiki_hypernyms = []
         if neologism.lower() in self.wiktionary:
-            wiktionary_data = self.wiktionary[neologism.lower()]
-            candidate_words = self.delete_bracets.sub("", get_taxonomy_fn(candidate)).split(',')
-
-            if any([candidate_word.lower() in wiktionary_data['hypernyms'] for candidate_word in candidate_words]):
-                wiki_count = 2
-
-            if any([any([candidate_word.lower() in i for candidate_word in candidate_words])
-                    for i in wiktionary_data['meanings']]):
-                definition_count = 2
-
-            if any([candidate_word.lower() in wiktionary_data['synonyms'] for candidate_word in candidate_words]):
-                synonym_count = 2
-
-            wiki_similarities = []
-            for wiki_hypernym in wiktionary_data['hypernyms']:
-                wiki_hypernym = wiki_hypernym.replace("|", " ").replace('--', '')
-                wiki_hypernym = self.pattern.sub("", wiki_hypernym)
-                if not all([i == " " for i in wiki_hypernym]):
-                    wiki_similarities.append(self.compute_similarity(wiki_hypernym.replace(" ", "_"), candidate))
-            if wiki_similarities:
-                wiki_similarity = sum(wiki_similarities) / len(wiki_similarities)
-
-        node2vec_similarity = self.get_node2vec_similarity(node2vec_vector, candidate)
-
-        # return synonym_count * 0.5 + definition_count * 0.8 + wiki_count * 0.5 + \
-        #        0.6 * count * self.get_similarity(neologism, candidate) + 2 * wiki_similarity + 2 * node2vec_similarity
-        return synonym_count * 2 + definition_count * 0.4 + wiki_count * 0.3 + 0.6 * count * self.get_similarity(
-        neologism, candidate) + 2 * wiki_similarity + 2 * node2vec_similarity
+            wiki_hypernyms = clean_wiki_hypernyms(self.wiktionary[neologism.lower()].hypernyms, self.pattern)
+        if not wiki_hypernyms:
+            return np.ones(len(candidates))
+        return self.synsets_matrix.mean_similarities(self.wiki_matrix.rows(wiki_hypernyms), candidates)
 
     def compute_similarity(self, neologism, candidate):
-        v1 = self.wiki_model[neologism]
-        v2 = self.w2v_synsets[candidate]
-        v1 = v1 / (sum(v1 ** 2) ** 0.5)
-        v2 = v2 / (sum(v2 ** 2) ** 0.5)
-        return 1 - spatial.distance.cosine(v1, v2)
+        return float(self.synsets_matrix.mean_similarities(self.wiki_matrix.rows([neologism]), [candidate])[0])
 
     def get_node2vec_similarity(self, v1, candidate):
-        v2 = self.node2vec[candidate]
-        v1 = v1 / (sum(v1 ** 2) ** 0.5)
-        v2 = v2 / (sum(v2 ** 2) ** 0.5)
-        return 1 - spatial.distance.cosine(v1, v2)
+        return float(self.node2vec_matrix.similarities(v1, [candidate])[0])
 
     def get_node2vec(self, neologism, topn=10) -> list:
-        neighbours, _ = self.projection.predict_projection_word(neologism, self.node2vec, topn=topn)
+        neighbours, _ = self.projection.predict_projection_word(neologism, self.node2vec_search, topn=topn)
         return neighbours
 
     def generate_node2vec(self, neologism, compute_hypernyms, topn=10) -> list:
         associates = map(itemgetter(0), self.get_node2vec(neologism, topn))
-        hchs = [hypernym for associate in associates for hypernym in compute_hypernyms(associate) if associate in self.w2v_synsets]
-        _, node2vec_vector = self.projection.predict_projection_word(neologism, self.node2vec)
+        hchs = chain_many(compute_hypernyms, [associate for associate in associates if associate in self.w2v_synsets])
+        _, node2vec_vector = self.projection.predict_projection_word(neologism, self.node2vec_search)
         return hchs, node2vec_vector
 
 
@@ -313,90 +467,109 @@ class RankedWikiModel(HCHModel):
 class LRModel(HCHModel):
     def __init__(self, params):
         super().__init__(params)
-        self.wiktionary = self.__get_wiktionary(params['wiki_path'])
-        self.wiki_model = KeyedVectors.load_word2vec_format(params['wiki_vectors_path'], binary=False)
-        self.node2vec = KeyedVectors.load_word2vec_format(params["node2vec_path"], binary=False)
+        self.wiktionary = get_wiktionary(params['wiki_path'])
+        self.wiki_model = get_vectors(params['wiki_vectors_path'])
+        self.node2vec = get_vectors(params["node2vec_path"])
+        self.node2vec_matrix = get_matrix(params["node2vec_path"])
+        self.node2vec_search = get_search(params["node2vec_path"], params.get("neighbour_search"))
         # self.projection = ProjectionVectorizer(self.w2v_data, params["projection_path"])
+        # a, b and y of vote
+        self.vote_params = params.get("vote_params", {})
 
-        self.delete_bracets = re.compile(r"\(.+?\)")
+        self.surface_forms = get_surface_forms(params)
         if params['language'] == 'ru':
             self.pattern = re.compile("[^А-я \-]")
         else:
             self.pattern = re.compile("[^A-z \-]")
 
-    def __get_wiktionary(self, path):
-        wiktionary = {}
-        with open(path, 'r') as f:
-            for line in f:
-                data = json.loads(line)
-                wiktionary[data['word']] = {"hypernyms": data['hypernyms'], "synonyms": data['synonyms'],
-                                            "meanings": data['meanings']}
-        return wiktionary
+    RANKING = "most_common"
+    WEIGHTS = {"count_similarity": 3.34506023, "wiki_similarity": 6.82626317, "not_wiki_similarity": 1.87866841,
+               "in_synonyms": 2.01482447, "not_in_synonyms": -0.36626615, "in_hypernyms": 1.42307518,
+               "not_in_hypernyms": 0.22548314, "in_definition": 2.06956417, "not_in_definition": -0.42100585,
+               "hyponym_count": 13.73838828, "not_hyponym_count": 0.0}
+    # score = 1.8554857 * similarity * count + wiki_similarity * 0.54429005 + in_synonyms * -5.42561308 +\
+    #         in_hypernyms * 3.68804553 + in_definition * 11.0702077
+    # score = count * similarity * 2.82635361 + wiki_similarity * 5.84246245 + not_wiki_similarity * 1.65507643 + \
+    #                     in_synonyms * 1.90194106 + not_in_synonyms * -0.26925806 + in_hypernyms * 1.61310472 + \
+    #                     not_in_hypernyms * 0.01957828 + in_definition * 2.12732149 + -0.49463849 * not_in_definition + \
+    #                     hyponym_count * 11.79374631 + not_hyponym_count * 0.0 + -1.65538476 * node2vec_similarity
+    WEIGHT_FEATURES = ("similarity", "wiki_similarity", "in_synonyms", "in_hypernyms", "in_definition",
+                       "not_in_hypernyms", "not_in_synonyms", "not_in_definition", "not_wiki_similarity")
 
     def compute_candidates(self, neologism, get_hypernym_fn, get_hyponym_fn, get_taxonomy_name_fn, topn=10):
-        hypernyms = self.compute_hchs(neologism, get_hypernym_fn, topn)
-        second_order_hypernyms = [s_o for hypernym in hypernyms for s_o in get_hypernym_fn(hypernym)]
-        all_hypernyms = Counter(hypernyms + second_order_hypernyms)
+        extracted = self.extract_features(neologism, get_hypernym_fn, get_hyponym_fn, get_taxonomy_name_fn, topn)
+        return self.rank_features(extracted, self.weights, self.vote_params, topn)
+
+    def extract_features(self, neologism, get_hypernym_fn, get_hyponym_fn, get_taxonomy_name_fn, topn=10) -> dict:
+        """
+        the hyponym votes depend on vote_params, so the vote edges are kept instead of them and every candidate
+        that gets an edge is extracted; prepare_features drops the ones without votes that are not hchs
+        """
+        all_hypernyms = self.count_hchs(neologism, get_hypernym_fn, topn)
         associates = self.generate_associates(neologism, 100)
 
-        votes = Counter()
-        for associate, similarity in associates:
-            distance = compute_distance(similarity)
-            for hypernym in get_hypernym_fn(associate):
-                votes[hypernym] += distance2vote(distance)
-                for second_order in get_hypernym_fn(hypernym):
-                    votes[second_order] += distance2vote(distance, y=0.5)
-
-        sorted_hypernyms = Counter()
-        for candidate in all_hypernyms + votes:
-            count = all_hypernyms.get(candidate, 1)
-            similarity, wiki_similarity, in_synonyms, \
-            in_hypernyms, in_definition, not_in_hypernyms, \
-            not_in_synonyms, not_in_definition, not_wiki_similarity = self.compute_weights(neologism, candidate,
-                                                                                           get_taxonomy_name_fn)
-
-            # score = 1.8554857 * similarity * count + wiki_similarity * 0.54429005 + in_synonyms * -5.42561308 +\
-            #         in_hypernyms * 3.68804553 + in_definition * 11.0702077
-
-            hyponym_count = votes.get(candidate, 0.0)
-            if hyponym_count == 0.0:
-                not_hyponym_count = 1.0
-            else:
-                not_hyponym_count = 0.0
-
-            # _, node2vec_vector = self.projection.predict_projection_word(neologism, self.node2vec)
-            # node2vec_similarity = self.get_node2vec_similarity(node2vec_vector, candidate)
-
-            score = count * similarity * 3.34506023 + wiki_similarity * 6.82626317 + not_wiki_similarity * 1.87866841 + \
-                    in_synonyms * 2.01482447 + not_in_synonyms * -0.36626615 + in_hypernyms * 1.42307518 + \
-                    not_in_hypernyms * 0.22548314 + in_definition * 2.06956417 + -0.42100585 * not_in_definition + \
-                    hyponym_count * 13.73838828 + not_hyponym_count * 0.0
-
-            # score = count * similarity * 2.82635361 + wiki_similarity * 5.84246245 + not_wiki_similarity * 1.65507643 + \
-            #                     in_synonyms * 1.90194106 + not_in_synonyms * -0.26925806 + in_hypernyms * 1.61310472 + \
-            #                     not_in_hypernyms * 0.01957828 + in_definition * 2.12732149 + -0.49463849 * not_in_definition + \
-            #                     hyponym_count * 11.79374631 + not_hyponym_count * 0.0 + -1.65538476 * node2vec_similarity
-            sorted_hypernyms[candidate] = score
-        return [i[0] for i in sorted_hypernyms.most_common(topn)]
+        voted, slots, sources, second_order = get_vote_edges(list(map(itemgetter(0), associates)), get_hypernym_fn)
+        # the order of all_hypernyms + votes
+        candidates = list(all_hypernyms) + [candidate for candidate in voted if candidate not in all_hypernyms]
+        index = {candidate: i for i, candidate in enumerate(candidates)}
+        slots = np.array([index[candidate] for candidate in voted], dtype=np.int64)[slots]
+
+        similarities = self.get_similarities(neologism, candidates)
+        definition_words = get_definition_words(self.wiktionary, self.surface_forms, neologism, candidates,
+                                                get_taxonomy_name_fn)
+        weights = np.array([self.compute_weights(neologism, candidate, get_taxonomy_name_fn, similarity,
+                                                 definition_words)
+                            for candidate, similarity in zip(candidates, similarities.tolist())], dtype=float)
+        features = dict(zip(self.WEIGHT_FEATURES, weights.reshape(-1, len(self.WEIGHT_FEATURES)).T))
+        features["count"] = np.array([all_hypernyms.get(candidate, 1) for candidate in candidates], dtype=float)
+        # _, node2vec_vector = self.projection.predict_projection_word(neologism, self.node2vec_search)
+        # node2vec_similarity = self.get_node2vec_similarity(node2vec_vector, candidate)
+        return {"candidates": candidates, "features": features,
+                "in_hchs": np.array([candidate in all_hypernyms for candidate in candidates], dtype=bool),
+                "vote_edges": (slots, sources, second_order),
+                "associate_similarities": np.array(list(map(itemgetter(1), associates)), dtype=float)}
+
+    @classmethod
+    def prepare_features(cls, extracted, vote_params=None):
+        """
+        adds hyponym_count and not_hyponym_count voted with vote_params, only hchs and voted candidates are ranked
+        """
+        slots, sources, second_order = extracted["vote_edges"]
+        _, votes = vote(extracted["associate_similarities"], (range(len(extracted["candidates"])), slots, sources,
+                                                              second_order), **(vote_params or {}))
+        features = dict(extracted["features"], hyponym_count=votes, not_hyponym_count=(votes == 0.0).astype(float))
+        return features, extracted["in_hchs"] | (votes > 0)
+
+    @staticmethod
+    def score_features(features, weights):
+        return features["count"] * features["similarity"] * weights["count_similarity"] + \
+               features["wiki_similarity"] * weights["wiki_similarity"] + \
+               features["not_wiki_similarity"] * weights["not_wiki_similarity"] + \
+               features["in_synonyms"] * weights["in_synonyms"] + \
+               features["not_in_synonyms"] * weights["not_in_synonyms"] + \
+               features["in_hypernyms"] * weights["in_hypernyms"] + \
+               features["not_in_hypernyms"] * weights["not_in_hypernyms"] + \
+               features["in_definition"] * weights["in_definition"] + \
+               weights["not_in_definition"] * features["not_in_definition"] + \
+               features["hyponym_count"] * weights["hyponym_count"] + \
+               features["not_hyponym_count"] * weights["not_hyponym_count"]
 
 
     def get_node2vec_similarity(self, v1, candidate):
-        v2 = self.node2vec[candidate]
-        v1 = v1 / (sum(v1 ** 2) ** 0.5)
-        v2 = v2 / (sum(v2 ** 2) ** 0.5)
-        return 1 - spatial.distance.cosine(v1, v2)
+        return float(self.node2vec_matrix.similarities(v1, [candidate])[0])
 
     def get_node2vec(self, neologism, topn=10) -> list:
-        neighbours, _ = self.projection.predict_projection_word(neologism, self.node2vec, topn=topn)
+        neighbours, _ = self.projection.predict_projection_word(neologism, self.node2vec_search, topn=topn)
         return neighbours
 
     def generate_node2vec(self, neologism, compute_hypernyms, topn=10) -> list:
         associates = map(itemgetter(0), self.get_node2vec(neologism, topn))
-        hchs = [hypernym for associate in associates for hypernym in compute_hypernyms(associate)]
+        hchs = chain_many(compute_hypernyms, associates)
         return hchs
 
-    def compute_weights(self, neologism, candidate, get_taxonomy_name_fn):
-        similarity = self.get_similarity(neologism, candidate)
+    def compute_weights(self, neologism, candidate, get_taxonomy_name_fn, similarity=None, definition_words=None):
+        if similarity is None:
+            similarity = self.get_similarity(neologism, candidate)
         wiki_similarity = 0.0
         not_wiki_similarity = 0.0
         in_synonyms = 0.0
@@ -406,28 +579,29 @@ class LRModel(HCHModel):
         not_in_hypernyms = 0.0
         not_in_definition = 0.0
 
-        candidate_words = self.delete_bracets.sub("", get_taxonomy_name_fn(candidate)).split(',')
+        candidate_words = self.surface_forms.get_name_words(candidate, get_taxonomy_name_fn)
         if neologism.lower() in self.wiktionary:
             wiktionary_data = self.wiktionary[neologism.lower()]
 
-            if any([candidate_word.lower() in wiktionary_data['hypernyms'] for candidate_word in candidate_words]):
+            if any([wiktionary_data.has_hypernym(candidate_word) for candidate_word in candidate_words]):
                 in_hypernyms = 1.0
             else:
                 not_in_hypernyms = 1.0
 
-            if any([candidate_word.lower() in wiktionary_data['synonyms'] for candidate_word in candidate_words]):
+            if any([wiktionary_data.has_synonym(candidate_word) for candidate_word in candidate_words]):
                 in_synonyms = 1.0
             else:
                 not_in_synonyms = 1.0
 
-            if any([any([candidate_word.lower() in i for candidate_word in candidate_words])
-                    for i in wiktionary_data['meanings']]):
+            if definition_words is None:
+                definition_words = wiktionary_data.find_in_meanings(candidate_words)
+            if any([candidate_word in definition_words for candidate_word in candidate_words]):
                 in_definition = 1.0
             else:
                 not_in_definition = 1.0
 
             wiki_similarities = []
-            # for wiki_hypernym in wiktionary_data['hypernyms']:
+            # for wiki_hypernym in wiktionary_data.hypernyms:
             #     wiki_hypernym = wiki_hypernym.replace("|", " ").replace('--', '')
             #     wiki_hypernym = self.pattern.sub("", wiki_hypernym)
             #     if not all([i == " " for i in wiki_hypernym]):
@@ -442,19 +616,15 @@ class LRModel(HCHModel):
         return similarity, wiki_similarity, in_synonyms, in_hypernyms, in_definition, not_in_hypernyms, not_in_synonyms, not_in_definition, not_wiki_similarity
 
     def compute_similarity(self, neologism, candidate):
-        v1 = self.wiki_model[neologism]
-        v2 = self.w2v_synsets[candidate]
-        v1 = v1 / (sum(v1 ** 2) ** 0.5)
-        v2 = v2 / (sum(v2 ** 2) ** 0.5)
-        return 1 - spatial.distance.cosine(v1, v2)
+        return float(self.synsets_matrix.similarities(self.wiki_model[neologism], [candidate])[0])
 
     def get_node2vec(self, neologism, topn=10) -> list:
-        neighbours, _ = self.projection.predict_projection_word(neologism, self.node2vec, topn=topn)
+        neighbours, _ = self.projection.predict_projection_word(neologism, self.node2vec_search, topn=topn)
         return neighbours
 
     def generate_node2vec(self, neologism, compute_hypernyms, topn=10) -> list:
         associates = map(itemgetter(0), self.get_node2vec(neologism, topn))
-        hchs = [hypernym for associate in associates for hypernym in compute_hypernyms(associate)]
+        hchs = chain_many(compute_hypernyms, associates)
         return hchs
 
 
@@ -466,35 +636,37 @@ class LRModel(HCHModel):
 class Node2vecBaselineModel(BaselineModel):
     def __init__(self, params):
         super().__init__(params)
-        self.node2vec = KeyedVectors.load_word2vec_format(params["node2vec_path"], binary=False)
+        self.node2vec = get_vectors(params["node2vec_path"])
+        self.node2vec_search = get_search(params["node2vec_path"], params.get("neighbour_search"))
         self.projection = ProjectionVectorizer(self.w2v_data, params["projection_path"])
 
+    def precompute_associates(self, neologisms, topn=ASSOCIATES_TOPN):
+        pass
+
     def generate_associates(self, neologism, topn=10) -> list:
-        neighbours, _ = self.projection.predict_projection_word(neologism, self.node2vec)
+        neighbours, _ = self.projection.predict_projection_word(neologism, self.node2vec_search)
         return neighbours
 
 
 class Node2VecRankedModel(RankedModel):
     def __init__(self, params):
         super().__init__(params)
-        self.node2vec = KeyedVectors.load_word2vec_format(params["node2vec_path"], binary=False)
+        self.node2vec = get_vectors(params["node2vec_path"])
+        self.node2vec_matrix = get_matrix(params["node2vec_path"])
+        self.node2vec_search = get_search(params["node2vec_path"], params.get("neighbour_search"))
         self.projection = ProjectionVectorizer(self.w2v_data, params["projection_path"])
 
     def compute_candidates(self, neologism, get_hypernym_fn, get_hyponym_fn, get_taxonomy_name_fn, topn=10):
         node2vec, node2vec_vector = self.generate_node2vec(neologism, get_hypernym_fn, topn)
-        second_order_hypernyms = [s_o for hypernym in node2vec for s_o in get_hypernym_fn(hypernym)]
+        second_order_hypernyms = chain_many(get_hypernym_fn, node2vec)
         all_hypernyms = Counter(node2vec + second_order_hypernyms)
-
-        sorted_hypernyms = reversed(sorted(all_hypernyms.items(), key=lambda x: self.get_node2vec_score(neologism,
-                                                                                                        node2vec_vector,
-                                                                                                        *x)))
-
-        return [i[0] for i in sorted_hypernyms][:topn]
+        # get_node2vec_score currently reduces to count * similarity
+        return self.rank_by_similarity(neologism, all_hypernyms)[:topn]
 
     def generate_node2vec(self, neologism, compute_hypernyms, topn=10) -> list:
-        neighbours, node2vec_vector = self.projection.predict_projection_word(neologism, self.node2vec)
+        neighbours, node2vec_vector = self.projection.predict_projection_word(neologism, self.node2vec_search)
         associates = map(itemgetter(0), neighbours)
-        hchs = [hypernym for associate in associates for hypernym in compute_hypernyms(associate)]
+        hchs = chain_many(compute_hypernyms, associates)
         return hchs, node2vec_vector
 
     def get_node2vec_score(self, neologism, node2vec_vector, candidate, count):
@@ -502,65 +674,65 @@ class Node2VecRankedModel(RankedModel):
                                                                     #                              candidate))
 
     def get_node2vec_similarity(self, v1, candidate):
-        v2 = self.node2vec[candidate]
-        v1 = v1 / (sum(v1 ** 2) ** 0.5)
-        v2 = v2 / (sum(v2 ** 2) ** 0.5)
-        return 1 - spatial.distance.cosine(v1, v2)
+        return float(self.node2vec_matrix.similarities(v1, [candidate])[0])
 
 
 class Node2VecModel(RankedModel):
     def __init__(self, params):
         super().__init__(params)
-        self.node2vec_wordnet = KeyedVectors.load_word2vec_format(params["node2vec_path"], binary=False)
-        self.node2vec = KeyedVectors.load_word2vec_format(params["projection_path"], binary=False)
+        self.node2vec_wordnet = get_vectors(params["node2vec_path"])
+        self.node2vec = get_vectors(params["projection_path"])
+        self.node2vec_wordnet_matrix = get_matrix(params["node2vec_path"])
+        self.node2vec_wordnet_search = get_search(params["node2vec_path"], params.get("neighbour_search"))
 
     def compute_candidates(self, neologism, get_hypernym_fn, get_hyponym_fn, get_taxonomy_name_fn, topn=10):
-        hypernyms = self.compute_hchs(neologism, get_hypernym_fn, topn)
-        second_order_hypernyms = [s_o for hypernym in hypernyms for s_o in get_hypernym_fn(hypernym)]
+        ft_hypernyms = self.count_hchs(neologism, get_hypernym_fn, topn)
 
         node2vec = self.compute_node2vec_candidates(neologism, get_hypernym_fn, topn)
-        second_order = [s_o for hypernym in node2vec for s_o in get_hypernym_fn(hypernym)]
+        second_order = chain_many(get_hypernym_fn, node2vec)
 
-        ft_hypernyms = Counter(hypernyms + second_order_hypernyms)
         n2v_hypernyms = Counter(node2vec + second_order)
 
 
         final_candidates = defaultdict(float)
 
-        for candidate, count in ft_hypernyms.items():
-            final_candidates[candidate] += count * self.get_similarity(neologism, candidate)
+        ft_scores = np.array(list(ft_hypernyms.values()), dtype=float) * \
+                    self.get_similarities(neologism, list(ft_hypernyms))
+        for candidate, score in zip(ft_hypernyms, ft_scores.tolist()):
+            final_candidates[candidate] += score
 
-        for candidate, count in n2v_hypernyms.items():
-            final_candidates[candidate] += count * self.get_node2vec_similarity(neologism, candidate)
+        n2v_scores = np.array(list(n2v_hypernyms.values()), dtype=float) * \
+                     self.get_node2vec_similarities(neologism, list(n2v_hypernyms))
+        for candidate, score in zip(n2v_hypernyms, n2v_scores.tolist()):
+            final_candidates[candidate] += score
 
-        return [i[0] for i in reversed(sorted(final_candidates.items(), key=lambda x: x[1]))][:topn]
+        return rank_candidates(list(final_candidates), np.array(list(final_candidates.values())))[:topn]
 
     def compute_node2vec_candidates(self, neologism, compute_hypernyms, topn=10) -> list:
-        neighbours = self.node2vec_wordnet.similar_by_vector(self.node2vec[neologism], topn)
+        neighbours = self.node2vec_wordnet_search.similar_by_vector(self.node2vec[neologism], topn)
         associates = map(itemgetter(0), neighbours)
-        hchs = [hypernym for associate in associates for hypernym in compute_hypernyms(associate)]
+        hchs = chain_many(compute_hypernyms, associates)
         return hchs
 
     def get_node2vec_score(self, neologism, candidate, count):
         return count * (self.get_similarity(neologism, candidate) + self.get_node2vec_similarity(neologism, candidate))
 
     def get_node2vec_similarity(self, neologism, candidate):
-        v1 = self.node2vec[neologism]
-        v2 = self.node2vec_wordnet[candidate]
-        v1 = v1 / (sum(v1 ** 2) ** 0.5)
-        v2 = v2 / (sum(v2 ** 2) ** 0.5)
-        return 1 - spatial.distance.cosine(v1, v2)
+        return float(self.get_node2vec_similarities(neologism, [candidate])[0])
+
+    def get_node2vec_similarities(self, neologism, candidates):
+        return self.node2vec_wordnet_matrix.similarities(self.node2vec[neologism], candidates)
 
 
 class PoincareEmbeddingsModel(BaselineModel):
     def __init__(self, params):
         super().__init__(params)
-        self.poincare_model = PoincareKeyedVectors.load_word2vec_format(params["poincare_path"], binary=False)
+        self.poincare_model = get_vectors(params["poincare_path"], PoincareKeyedVectors)
         self.n = params["n"]
 
     def compute_candidates(self, neologism, get_hypernym_fn, get_hyponym_fn,
                            get_taxonomy_name_fn, topn=10) -> list:
-        similars = [i[0] for i in self.w2v_synsets.similar_by_vector(self.w2v_data[neologism])]
+        similars = [i[0] for i in self.generate_associates(neologism)]
         mean_poincare = self.aggregate(similars)
         candidates = [i[0] for i in self.poincare_model.most_similar(mean_poincare)]
         hchs = self.compute_hchs(candidates, get_hypernym_fn)
@@ -573,7 +745,7 @@ class PoincareEmbeddingsModel(BaselineModel):
         return similarity
 
     def compute_hchs(self, associates, compute_hypernyms, topn=10) -> list:
-        hchs = [hypernym for associate in associates for hypernym in compute_hypernyms(associate)]
+        hchs = chain_many(compute_hypernyms, associates)
         return hchs
 
     def aggregate(self, synsets):
@@ -587,20 +759,21 @@ class PoincareEmbeddingsModel(BaselineModel):
 class Node2vecEmbeddingsModel(BaselineModel):
     def __init__(self, params):
         super().__init__(params)
-        self.node2vec = KeyedVectors.load_word2vec_format(params["node2vec_path"], binary=False)
+        self.node2vec = get_vectors(params["node2vec_path"])
+        self.node2vec_search = get_search(params["node2vec_path"], params.get("neighbour_search"))
         self.n = params["n"]
 
     def compute_candidates(self, neologism, get_hypernym_fn, get_hyponym_fn,
                            get_taxonomy_name_fn, topn=10) -> list:
-        similars = [i[0] for i in self.w2v_synsets.similar_by_vector(self.w2v_data[neologism])]
+        similars = [i[0] for i in self.generate_associates(neologism)]
         mean_node2vec = np.mean([self.node2vec[i] for i in similars[:self.n] if i in self.node2vec.vocab], 0)
-        candidates = [i[0] for i in self.node2vec.similar_by_vector(mean_node2vec)]
+        candidates = [i[0] for i in self.node2vec_search.similar_by_vector(mean_node2vec)]
         candidates = [i for i in candidates if i in self.w2v_synsets.vocab]
         hchs = self.compute_hchs(candidates, get_hypernym_fn)
         return [i[0] for i in Counter(candidates+hchs).most_common(10)]
 
     def compute_hchs(self, associates, compute_hypernyms, topn=10) -> list:
-        hchs = [hypernym for associate in associates for hypernym in compute_hypernyms(associate)]
+        hchs = chain_many(compute_hypernyms, associates)
         return hchs
 
 
@@ -611,6 +784,10 @@ class CombinedModel(BaselineModel):
         self.poincare = PoincareEmbeddingsModel(params)
         self.fasttext = RankedModel(params)
 
+    def precompute_associates(self, neologisms, topn=ASSOCIATES_TOPN):
+        for model in (self.node2vec, self.poincare, self.fasttext):
+            model.precompute_associates(neologisms, topn)
+
     def compute_candidates(self, neologism, get_hypernym_fn, get_hyponym_fn,
                            get_taxonomy_name_fn, topn=10) -> list:
         fasttext_candidates = self.fasttext.compute_candidates(neologism, get_hypernym_fn, get_hyponym_fn,
@@ -631,114 +808,91 @@ class CombinedModel(BaselineModel):
 class AllModel(HCHModel):
     def __init__(self, params):
         super().__init__(params)
-        self.wiktionary = self.__get_wiktionary(params['wiki_path'])
-        self.wiki_model = KeyedVectors.load_word2vec_format(params['wiki_vectors_path'], binary=False)
-        self.node2vec = KeyedVectors.load_word2vec_format(params["node2vec_path"], binary=False)
+        self.wiktionary = get_wiktionary(params['wiki_path'])
+        self.wiki_model = get_vectors(params['wiki_vectors_path'])
+        self.node2vec = get_vectors(params["node2vec_path"])
         self.n = params['n']
         self.projection = ProjectionVectorizer(self.w2v_data, params["projection_path"])
-        self.poincare_model = PoincareKeyedVectors.load_word2vec_format(params["poincare_path"], binary=False)
+        self.poincare_model = get_vectors(params["poincare_path"], PoincareKeyedVectors)
         self.n = params["n"]
+        self.wiki_matrix = get_matrix(params['wiki_vectors_path'])
+        self.node2vec_matrix = get_matrix(params["node2vec_path"])
+        self.node2vec_search = get_search(params["node2vec_path"], params.get("neighbour_search"))
 
-        self.delete_bracets = re.compile(r"\(.+?\)")
+        self.surface_forms = get_surface_forms(params)
         if params['language'] == 'ru':
             self.pattern = re.compile("[^А-я \-]")
         else:
             self.pattern = re.compile("[^A-z \-]")
 
-    def __get_wiktionary(self, path):
-        wiktionary = {}
-        with open(path, 'r') as f:
-            for line in f:
-                data = json.loads(line)
-                wiktionary[data['word']] = {"hypernyms": data['hypernyms'], "synonyms": data['synonyms'],
-                                            "meanings": data['meanings']}
-        return wiktionary
+    WEIGHTS = {"synonym_count": 2, "definition_count": 0.4, "wiki_count": 0.3, "count_similarity": 0.6,
+               "wiki_similarity": 2, "node2vec_similarity": 2, "poincare_similarity": 2}
 
     def compute_candidates(self, neologism, get_hypernym_fn, get_hyponym_fn, get_taxonomy_name_fn, topn=10):
-        hypernyms = self.compute_hchs(neologism, get_hypernym_fn, topn)
-        second_order_hypernyms = [s_o for hypernym in hypernyms for s_o in get_hypernym_fn(hypernym)]
-        all_hypernyms = Counter(hypernyms + second_order_hypernyms)
+        extracted = self.extract_features(neologism, get_hypernym_fn, get_hyponym_fn, get_taxonomy_name_fn, topn)
+        return self.rank_features(extracted, self.weights, topn=topn)
+
+    def extract_features(self, neologism, get_hypernym_fn, get_hyponym_fn, get_taxonomy_name_fn, topn=10) -> dict:
+        all_hypernyms = self.count_hchs(neologism, get_hypernym_fn, topn)
         associates = self.generate_associates(neologism, 50)
 
         node2vec, mean_node2vec = self.generate_node2vec(neologism, get_hypernym_fn, topn)
-        similars = [i[0] for i in self.w2v_synsets.similar_by_vector(self.w2v_data[neologism])]
+        similars = [i[0] for i in self.generate_associates(neologism)]
         poincare_vector = self.aggregate(similars)
 
-        votes = Counter()
-        for associate, similarity in associates:
-            for hypernym in get_hypernym_fn(associate):
-                votes[hypernym] += similarity
-        sorted_hypernyms = reversed(sorted((all_hypernyms + votes).items(),
-                                           key=lambda x: self.get_wiki_score(neologism, get_taxonomy_name_fn,
-                                                                             mean_node2vec, poincare_vector,
-                                                                             *x)
-                                           ))
-        return [i[0] for i in sorted_hypernyms][:topn]
-
-    def get_wiki_score(self, neologism, get_taxonomy_fn, node2vec_vector, poincare_vector, candidate, count):
-        wiki_count = 0.3
-        definition_count = 0.8
-        synonym_count = 1
-        wiki_similarity = 1
-
+        all_candidates = all_hypernyms + count_votes(associates, get_hypernym_fn)
+        candidates = list(all_candidates)
+        features = get_wiki_count_features(self.wiktionary, self.surface_forms, neologism, candidates,
+                                           get_taxonomy_name_fn)
+        features["count"] = np.array(list(all_candidates.values()), dtype=float)
+        features["similarity"] = self.get_similarities(neologism, candidates)
+        features["wiki_similarity"] = self.get_wiki_similarities(neologism, candidates)
+        features["node2vec_similarity"] = self.node2vec_matrix.similarities(mean_node2vec, candidates)
+        features["poincare_similarity"] = self.get_poincare_similarities(poincare_vector, candidates)
+        return {"candidates": candidates, "features": features}
+
+    @staticmethod
+    def score_features(features, weights):
+        scores = features["synonym_count"] * weights["synonym_count"] + \
+                 features["definition_count"] * weights["definition_count"] + \
+                 features["wiki_count"] * weights["wiki_count"]
+        return scores + weights["count_similarity"] * features["count"] * features["similarity"] + \
+               weights["wiki_similarity"] * features["wiki_similarity"] + \
+               weights["node2vec_similarity"] * features["node2vec_similarity"] + \
+               weights["poincare_similarity"] * features["poincare_similarity"]
+
+    def get_wiki_similarities(self, neologism, candidates):
+        wiki_hypernyms = []
         if neologism.lower() in self.wiktionary:
-            wiktionary_data = self.wiktionary[neologism.lower()]
-            candidate_words = self.delete_bracets.sub("", get_taxonomy_fn(candidate)).split(',')
-
-            if any([candidate_word.lower() in wiktionary_data['hypernyms'] for candidate_word in candidate_words]):
-                wiki_count = 2
-
-            if any([any([candidate_word.lower() in i for candidate_word in candidate_words])
-                    for i in wiktionary_data['meanings']]):
-                definition_count = 2
-
-            if any([candidate_word.lower() in wiktionary_data['synonyms'] for candidate_word in candidate_words]):
-                synonym_count = 2
-
-            wiki_similarities = []
-            for wiki_hypernym in wiktionary_data['hypernyms']:
-                wiki_hypernym = wiki_hypernym.replace("|", " ").replace('--', '')
-                wiki_hypernym = self.pattern.sub("", wiki_hypernym)
-                if not all([i == " " for i in wiki_hypernym]):
-                    wiki_similarities.append(self.compute_similarity(wiki_hypernym.replace(" ", "_"), candidate))
-            if wiki_similarities:
-                wiki_similarity = sum(wiki_similarities) / len(wiki_similarities)
-
-        node2vec_similarity = self.get_node2vec_similarity(node2vec_vector, candidate)
-        poincare_similarity = self.get_poincare_similarity(poincare_vector, candidate)
-
-        # return synonym_count * 0.5 + definition_count * 0.8 + wiki_count * 0.5 + \
-        #        0.6 * count * self.get_similarity(neologism, candidate) + 2 * wiki_similarity + 2 * node2vec_similarity
-        return synonym_count * 2 + definition_count * 0.4 + wiki_count * 0.3 + 0.6 * count * self.get_similarity(
-        neologism, candidate) + 2 * wiki_similarity + 2 * node2vec_similarity + 2 * poincare_similarity
+            wiki_hypernyms = clean_wiki_hypernyms(self.wiktionary[neologism.lower()].hypernyms, self.pattern)
+        if not wiki_hypernyms:
+            return np.ones(len(candidates))
+        return self.synsets_matrix.mean_similarities(self.wiki_matrix.rows(wiki_hypernyms), candidates)
 
     def compute_similarity(self, neologism, candidate):
-        v1 = self.wiki_model[neologism]
-        v2 = self.w2v_synsets[candidate]
-        v1 = v1 / (sum(v1 ** 2) ** 0.5)
-        v2 = v2 / (sum(v2 ** 2) ** 0.5)
-        return 1 - spatial.distance.cosine(v1, v2)
+        return float(self.synsets_matrix.mean_similarities(self.wiki_matrix.rows([neologism]), [candidate])[0])
 
     def get_node2vec_similarity(self, v1, candidate):
-        v2 = self.node2vec[candidate]
-        v1 = v1 / (sum(v1 ** 2) ** 0.5)
-        v2 = v2 / (sum(v2 ** 2) ** 0.5)
-        return 1 - spatial.distance.cosine(v1, v2)
+        return float(self.node2vec_matrix.similarities(v1, [candidate])[0])
 
     def get_node2vec(self, neologism, topn=10) -> list:
-        neighbours, _ = self.projection.predict_projection_word(neologism, self.node2vec, topn=topn)
+        neighbours, _ = self.projection.predict_projection_word(neologism, self.node2vec_search, topn=topn)
         return neighbours
 
     def generate_node2vec(self, neologism, compute_hypernyms, topn=10) -> list:
         associates = map(itemgetter(0), self.get_node2vec(neologism, topn))
-        hchs = [hypernym for associate in associates for hypernym in compute_hypernyms(associate) if associate in self.w2v_synsets]
-        _, node2vec_vector = self.projection.predict_projection_word(neologism, self.node2vec)
+        hchs = chain_many(compute_hypernyms, [associate for associate in associates if associate in self.w2v_synsets])
+        _, node2vec_vector = self.projection.predict_projection_word(neologism, self.node2vec_search)
         return hchs, node2vec_vector
 
     def get_poincare_similarity(self, neologism, candidate):
-        distance = self.poincare_model.distances(neologism, [candidate])[0]
-        similarity = 1 / (1 + distance)
-        return similarity
+        return float(self.get_poincare_similarities(neologism, [candidate])[0])
+
+    def get_poincare_similarities(self, vector, candidates):
+        if not candidates:
+            return np.zeros(0)
+        distances = self.poincare_model.distances(vector, candidates)
+        return 1 / (1 + distances)
 
     def aggregate(self, synsets):
         synsets = synsets[:self.n]
@@ -0,0 +1,90 @@
+import hashlib
+import json
+import os
+
+# config keys that change how predictions are computed or evaluated but not the predictions themselves:
+# runtime options, precomputed caches of the taxonomy and the gold file
+RUNTIME_KEYS = ("n_jobs", "batch_size", "stream", "taxonomy_backend", "db_options", "closure_path",
+                "surface_forms_path", "wordnet_graph_path", "gold_path")
+
+
+def get_checkpoint_path(output_path):
+    return output_path + ".checkpoint"
+
+
+def get_config_hash(params):
+    config = {key: value for key, value in params.items() if key not in RUNTIME_KEYS}
+    return hashlib.md5(json.dumps(config, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class StreamingWriter:
+    """
+    appends the hypernyms of every word to output_path as soon as they are predicted. <output_path>.checkpoint
+    holds the config hash and, for every finished word, the size of the output after it; a rerun with the same
+    config truncates the output to the last finished word and skips the words that are already done
+    """
+    def __init__(self, output_path, params):
+        self.output_path = output_path
+        self.checkpoint_path = get_checkpoint_path(output_path)
+        self.config_hash = get_config_hash(params)
+        self.done = set()
+        self.checkpoint_size = 0
+        offset = self.__read_checkpoint()
+        if offset is None:
+            self.output = open(output_path, 'wb')
+            self.checkpoint = open(self.checkpoint_path, 'wb')
+            self.checkpoint.write(f"{self.config_hash}\n".encode('utf-8'))
+            self.checkpoint.flush()
+        else:
+            self.output = open(output_path, 'r+b')
+            self.output.truncate(offset)
+            self.output.seek(offset)
+            self.checkpoint = open(self.checkpoint_path, 'r+b')
+            self.checkpoint.truncate(self.checkpoint_size)
+            self.checkpoint.seek(self.checkpoint_size)
+
+    def __read_checkpoint(self):
+        """
+        :return: output size after the last finished word or None if there is nothing to resume
+        """
+        if not os.path.exists(self.output_path) or not os.path.exists(self.checkpoint_path):
+            return None
+        with open(self.checkpoint_path, 'rb') as f:
+            content = f.read()
+        # the last line may be cut off by an interrupted run
+        self.checkpoint_size = content.rfind(b"\n") + 1
+        lines = content[:self.checkpoint_size].decode('utf-8').split("\n")
+        if lines[0] != self.config_hash:
+            return None
+        offset = 0
+        for line in lines[1:-1]:
+            word, offset = line.rsplit("\t", 1)
+            self.done.add(word)
+        offset = int(offset)
+        if os.path.getsize(self.output_path) < offset:
+            raise Exception(f"{self.output_path} is shorter than {self.checkpoint_path} says")
+        return offset
+
+    def remaining(self, words) -> list:
+        """
+        words that are not written yet, each once, in the given order
+        """
+        seen = set(self.done)
+        return [word for word in words if not (word in seen or seen.add(word))]
+
+    def write(self, word, hypernyms):
+        self.output.write("".join(f"{word}\t{hypernym}\n" for hypernym in hypernyms).encode('utf-8'))
+        self.output.flush()
+        self.checkpoint.write(f"{word}\t{self.output.tell()}\n".encode('utf-8'))
+        self.checkpoint.flush()
+        self.done.add(word)
+
+    def close(self):
+        self.output.close()
+        self.checkpoint.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
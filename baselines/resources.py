@@ -0,0 +1,92 @@
+import json
+import os
+
+import numpy as np
+from gensim.models import KeyedVectors
+
+from embedding_store import load_normalized, load_vectors
+from hypernym_closure import TAXONOMY_KEYS, HypernymClosure
+from neighbour_search import build_search
+from similarity import EmbeddingMatrix
+from surface_forms import SurfaceForms, get_taxonomy_forms
+from taxonomy_graph import TaxonomyGraph
+from wiktionary_store import WiktionaryStore
+from wordnet_graph import get_vocab_hash
+
+# process-wide registry of loaded resources, so models built in one process share them
+_resources = {}
+
+
+def get_resource(key, loader):
+    if key not in _resources:
+        _resources[key] = loader()
+    return _resources[key]
+
+
+def clear_resources():
+    _resources.clear()
+
+
+def get_vectors(path, cls=KeyedVectors):
+    path = os.path.abspath(path)
+    return get_resource(("vectors", path, cls.__name__), lambda: load_vectors(path, cls))
+
+
+def get_synset_vocab_hash(path):
+    """
+    wordnet_graph.get_vocab_hash of the vectors stored at path, computed once per process
+    """
+    path = os.path.abspath(path)
+    return get_resource(("vocab_hash", path), lambda: get_vocab_hash(get_vectors(path).vocab))
+
+
+def get_matrix(path):
+    """
+    L2-normalized EmbeddingMatrix of the vectors stored at path, memory-mapped for .npy stores
+    """
+    path = os.path.abspath(path)
+    return get_resource(("matrix", path), lambda: EmbeddingMatrix(get_vectors(path), load_normalized(path)))
+
+
+def get_search(path, search_params=None):
+    """
+    nearest-neighbour search backend over the vectors stored at path, see neighbour_search.build_search
+    """
+    path = os.path.abspath(path)
+    key = ("search", path, json.dumps(search_params, sort_keys=True))
+    return get_resource(key, lambda: build_search(get_matrix(path), path, search_params))
+
+
+def get_projection(path):
+    path = os.path.abspath(path)
+    return get_resource(("projection", path), lambda: np.loadtxt(path, delimiter=','))
+
+
+def get_closure(path, fingerprint):
+    path = os.path.abspath(path)
+    return get_resource(("closure", path, fingerprint), lambda: HypernymClosure.load(path, fingerprint))
+
+
+def get_taxonomy_graph(path):
+    path = os.path.abspath(path)
+    return get_resource(("taxonomy_graph", path), lambda: TaxonomyGraph.load(path))
+
+
+def get_wiktionary(path):
+    """
+    loaded when it is first requested, so that workers forked afterwards share the entries of the parent process
+    """
+    path = os.path.abspath(path)
+    return get_resource(("wiktionary", path), lambda: WiktionaryStore(path).load())
+
+
+def get_surface_forms(params):
+    """
+    SurfaceForms saved at the surface_forms_path of params by surface_forms.py, or built from the configured
+    taxonomy when no path is given
+    """
+    if "surface_forms_path" in params:
+        path = os.path.abspath(params["surface_forms_path"])
+        return get_resource(("surface_forms", path), lambda: SurfaceForms.load(path))
+    taxonomy = json.dumps({key: params[key] for key in TAXONOMY_KEYS if key in params}, sort_keys=True)
+    return get_resource(("surface_forms", taxonomy), lambda: SurfaceForms.build(*get_taxonomy_forms(params)))
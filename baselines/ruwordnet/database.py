@@ -1,18 +1,50 @@
+import pathlib
 import sqlite3
+from itertools import islice
+
+
+# SQLite's smallest default limit of host parameters in a statement
+MAX_VARIABLES = 999
+# bumped whenever create_ruwordnet adds to the schema, older databases are migrated on open
+SCHEMA_VERSION = 1
+
+
+def chunks(items, size=MAX_VARIABLES):
+    items = list(items)
+    return [items[i:i + size] for i in range(0, len(items), size)]
 
 
 class DatabaseRuWordnet(object):
-    def __init__(self, path="ruwordnet/ruwordnet.db"):
-        self.conn = sqlite3.connect(path)
+    def __init__(self, path="ruwordnet/ruwordnet.db", read_only=False, wal=False, mmap_size=0):
+        """
+        :param read_only: opens an existing database without write access, any number of processes can read it
+        :param wal: write-ahead journal, readers are not blocked while the database is written
+        :param mmap_size: bytes of the database file read through a memory map instead of read calls
+        """
+        self.read_only = read_only
+        if read_only:
+            self.conn = sqlite3.connect(pathlib.Path(path).resolve().as_uri() + "?mode=ro", uri=True)
+        else:
+            self.conn = sqlite3.connect(path)
         self.cursor = self.conn.cursor()
-        self.cursor.execute('PRAGMA encoding = "UTF-8"')
-        self.cursor.execute('PRAGMA auto_vacuum = 1')
-        self.create_ruwordnet()
+        if mmap_size:
+            self.cursor.execute(f'PRAGMA mmap_size = {int(mmap_size)}')
+        if not read_only:
+            self.cursor.execute('PRAGMA encoding = "UTF-8"')
+            self.cursor.execute('PRAGMA auto_vacuum = 1')
+            if wal:
+                self.cursor.execute('PRAGMA journal_mode = WAL')
+            self.create_ruwordnet()
+        elif self.get_schema_version() < SCHEMA_VERSION:
+            raise Exception(f"{path} has an older schema, open it once without read_only to migrate it")
 
     def is_empty(self):
         return self.cursor.execute('SELECT COUNT(id) FROM synsets').fetchall()[0][0] == \
                self.cursor.execute('SELECT COUNT(hypernym_id) FROM relations').fetchall()[0][0] == 0
 
+    def get_schema_version(self):
+        return self.cursor.execute('PRAGMA user_version').fetchall()[0][0]
+
     def create_ruwordnet(self):
         self.cursor.execute("""CREATE TABLE IF NOT EXISTS synsets 
         (id text NOT NULL PRIMARY KEY, ruthes_name text)""")
@@ -20,19 +52,38 @@ class DatabaseRuWordnet(object):
                 (sense_id text NOT NULL PRIMARY KEY, synset_id text, sense_name text)""")
         self.cursor.execute("""CREATE TABLE IF NOT EXISTS relations 
         (hypernym_id text NOT NULL, hyponym_id text NOT NULL, PRIMARY KEY(hypernym_id, hyponym_id))""")
+        if self.get_schema_version() < SCHEMA_VERSION:
+            self.migrate()
         self.conn.commit()
 
-    def insert_synsets(self, synsets):
-        self.cursor.executemany("INSERT INTO synsets VALUES (?,?)", synsets)
-        self.conn.commit()
-
-    def insert_relations(self, relations):
-        self.cursor.executemany("INSERT INTO relations VALUES (?,?)", relations)
-        self.conn.commit()
-
-    def insert_senses(self, senses):
-        self.cursor.executemany("INSERT INTO senses VALUES (?,?,?)", senses)
-        self.conn.commit()
+    def migrate(self):
+        # covering indexes for the lookups that are not served by a primary key
+        self.cursor.execute("""CREATE INDEX IF NOT EXISTS relations_hyponym ON relations (hyponym_id, hypernym_id)""")
+        self.cursor.execute("""CREATE INDEX IF NOT EXISTS synsets_name ON synsets (ruthes_name, id)""")
+        self.cursor.execute("""CREATE INDEX IF NOT EXISTS senses_name ON senses (sense_name, synset_id)""")
+        self.cursor.execute('ANALYZE')
+        self.cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+    def insert_many(self, query, rows, commit=True, batch_size=10000):
+        """
+        inserts rows of any iterable in batches of batch_size, without building the full list
+        """
+        rows = iter(rows)
+        batch = list(islice(rows, batch_size))
+        while batch:
+            self.cursor.executemany(query, batch)
+            batch = list(islice(rows, batch_size))
+        if commit:
+            self.conn.commit()
+
+    def insert_synsets(self, synsets, commit=True):
+        self.insert_many("INSERT INTO synsets VALUES (?,?)", synsets, commit)
+
+    def insert_relations(self, relations, commit=True):
+        self.insert_many("INSERT INTO relations VALUES (?,?)", relations, commit)
+
+    def insert_senses(self, senses, commit=True):
+        self.insert_many("INSERT INTO senses VALUES (?,?,?)", senses, commit)
 
     def get_synset_names(self):
         return set([i[0] for i in self.cursor.execute('''SELECT ruthes_name FROM synsets''').fetchall()])
@@ -52,11 +103,12 @@ class DatabaseRuWordnet(object):
             return "100464-N"
         else:
             name = name.upper()
-        synset_id = self.cursor.execute('''SELECT id FROM synsets WHERE ruthes_name = ?''', (name.upper(), )).fetchall()
+        synset_id = self.cursor.execute('''SELECT id FROM synsets WHERE ruthes_name = ? ORDER BY rowid''',
+                                        (name.upper(), )).fetchall()
         return synset_id[-1][0] if len(synset_id) > 0 else ''
 
     def get_name_by_id(self, synset_id):
-        name = self.cursor.execute('''SELECT ruthes_name FROM synsets WHERE id="{}"'''.format(synset_id)).fetchall()
+        name = self.cursor.execute('''SELECT ruthes_name FROM synsets WHERE id = ?''', (synset_id, )).fetchall()
         return name[0][0] if len(name) > 0 else ''
 
     def get_hyponyms_by_name(self, name):
@@ -64,8 +116,8 @@ class DatabaseRuWordnet(object):
         return self.get_hyponyms_by_id(synset_id)
 
     def get_hyponyms_by_id(self, synset_id):
-        hyponym_list = self.cursor.execute('''SELECT hypernym_id FROM relations WHERE hyponym_id="{}"'''
-                                           .format(synset_id))
+        hyponym_list = self.cursor.execute('''SELECT hypernym_id FROM relations WHERE hyponym_id = ? ORDER BY rowid''',
+                                           (synset_id, ))
         return [i[0] for i in hyponym_list.fetchall()]
 
     def get_hypernyms_by_name(self, name):
@@ -73,29 +125,90 @@ class DatabaseRuWordnet(object):
         return self.get_hypernyms_by_id(synset_id)
 
     def get_hypernyms_by_id(self, synset_id):
-        hypernym_list = self.cursor.execute('''SELECT hyponym_id FROM relations WHERE hypernym_id="{}"'''
-                                            .format(synset_id))
+        hypernym_list = self.cursor.execute('''SELECT hyponym_id FROM relations WHERE hypernym_id = ?
+                                               ORDER BY hyponym_id''', (synset_id, ))
         return [i[0] for i in hypernym_list.fetchall()]
 
+    # -------------------------------------------------------------
+    # bulk lookups, one query for every MAX_VARIABLES ids
+    # -------------------------------------------------------------
+
+    def select_many(self, query, keys):
+        """
+        :param query: statement with {} in place of the list of the IN clause
+        :return: rows of query for all keys
+        """
+        rows = []
+        for chunk in chunks(dict.fromkeys(keys)):
+            rows.extend(self.cursor.execute(query.format(",".join("?" * len(chunk))), chunk).fetchall())
+        return rows
+
+    @staticmethod
+    def group_rows(keys, rows) -> dict:
+        """
+        :return: key -> values of (key, value) rows in the order of rows, empty lists for keys without rows
+        """
+        groups = {key: [] for key in keys}
+        for key, value in rows:
+            groups[key].append(value)
+        return groups
+
+    def get_hypernyms_by_ids(self, synset_ids) -> dict:
+        """
+        :return: synset id -> get_hypernyms_by_id of the id
+        """
+        synset_ids = list(synset_ids)
+        rows = self.select_many('''SELECT hypernym_id, hyponym_id FROM relations WHERE hypernym_id IN ({})
+                                   ORDER BY hypernym_id, hyponym_id''', synset_ids)
+        return self.group_rows(synset_ids, rows)
+
+    def get_hyponyms_by_ids(self, synset_ids) -> dict:
+        """
+        :return: synset id -> get_hyponyms_by_id of the id
+        """
+        synset_ids = list(synset_ids)
+        rows = self.select_many('''SELECT hyponym_id, hypernym_id FROM relations WHERE hyponym_id IN ({})
+                                   ORDER BY rowid''', synset_ids)
+        return self.group_rows(synset_ids, rows)
+
+    def get_names_by_ids(self, synset_ids) -> dict:
+        """
+        :return: synset id -> get_name_by_id of the id
+        """
+        synset_ids = list(synset_ids)
+        names = dict(self.select_many('''SELECT id, ruthes_name FROM synsets WHERE id IN ({})''', synset_ids))
+        return {synset_id: names.get(synset_id, '') for synset_id in synset_ids}
+
+    def get_synsets_by_senses(self, senses) -> dict:
+        """
+        :return: sense name -> get_synset_by_sense of the name
+        """
+        senses = list(senses)
+        synsets = {}
+        for sense, synset_id in self.select_many('''SELECT sense_name, synset_id FROM senses WHERE sense_name IN ({})
+                                                    ORDER BY rowid''', senses):
+            synsets.setdefault(sense, synset_id)
+        return {sense: synsets.get(sense, '') for sense in senses}
+
     def get_all_relations(self):
-        return self.cursor.execute('''SELECT * FROM relations''').fetchall()
+        return self.cursor.execute('''SELECT * FROM relations ORDER BY rowid''').fetchall()
 
     def get_all_synsets(self, endswith=""):
-        return [i for i in self.cursor.execute('''SELECT * FROM synsets''').fetchall() if i[0].endswith(endswith)]
+        return [i for i in self.cursor.execute('''SELECT * FROM synsets ORDER BY rowid''').fetchall()
+                if i[0].endswith(endswith)]
 
     def get_all_ids(self, endswith=""):
-        return [i[0] for i in self.cursor.execute('''SELECT id FROM synsets''').fetchall() if i[0].endswith(endswith)]
+        return [i[0] for i in self.cursor.execute('''SELECT id FROM synsets ORDER BY id''').fetchall()
+                if i[0].endswith(endswith)]
 
     def get_all_senses(self):
-        return self.cursor.execute('''SELECT * FROM senses''').fetchall()
+        return self.cursor.execute('''SELECT * FROM senses ORDER BY rowid''').fetchall()
 
     def is_hyponym(self, first, second):
-        return self.cursor.execute('''SELECT * FROM relations WHERE hypernym_id="{}" and hyponym_id="{}"'''
-                                            .format(first, second)).fetchall()
+        return self.cursor.execute('''SELECT * FROM relations WHERE hypernym_id = ? and hyponym_id = ?''',
+                                   (first, second)).fetchall()
 
     def get_synset_by_sense(self, sense):
-        synset_id = self.cursor.execute('''SELECT synset_id from senses where sense_name="{}"'''
-                                        .format(sense)).fetchall()
+        synset_id = self.cursor.execute('''SELECT synset_id FROM senses WHERE sense_name = ? ORDER BY rowid''',
+                                        (sense, )).fetchall()
         return synset_id[0][0] if len(synset_id) > 0 else ''
-
-
@@ -1,41 +1,63 @@
-from bs4 import BeautifulSoup
+import multiprocessing
 import os
-import codecs
+from xml.etree import ElementTree
 
 from ruwordnet.database import DatabaseRuWordnet
+from taxonomy_graph import TaxonomyGraph
 
 
-def get_soup(file):
-    with codecs.open(file, encoding='utf-8')as f:
-        handler = f.read()
-    return BeautifulSoup(handler, features="lxml")
+def iter_elements(file, tag):
+    """
+    yields the tag elements of an xml file as soon as they are parsed; elements are dropped from the tree
+    once handled, so memory stays bounded by a single element
+    """
+    context = ElementTree.iterparse(file, events=('start', 'end'))
+    _, root = next(context)
+    for event, element in context:
+        if event == 'end' and element.tag == tag:
+            yield element
+            root.clear()
 
 
 def parse_synsets(file):
-    soup = get_soup(file)
-    return [(element.attrs['id'], element.attrs['ruthes_name']) for element in soup.findAll('synset')]
+    for element in iter_elements(file, 'synset'):
+        yield element.attrib['id'], element.attrib['ruthes_name']
 
 
 def parse_relations(file):
-    relations = []
-    soup = get_soup(file)
-    for element in soup.findAll('relation'):
-        relation = element.attrs
+    for element in iter_elements(file, 'relation'):
+        relation = element.attrib
         if relation['name'] in ('hypernym', 'instance hypernym'):
-            relations.append((relation['parent_id'], relation['child_id']))
-    return relations
+            yield relation['parent_id'], relation['child_id']
 
 
 def parse_senses_lemmas(file):
-    soup = get_soup(file)
-    return [(el.attrs['id'], element.attrs['id'], el.text) for element in soup.findAll('synset')
-           for el in element.findAll('sense')]
+    for element in iter_elements(file, 'synset'):
+        for el in element.iter('sense'):
+            yield el.attrib['id'], element.attrib['id'], "".join(el.itertext())
 
 
 def parse_senses(file):
-    soup = get_soup(file)
-    return [(element.attrs['id'], element.attrs['synset_id'], element.attrs['name']) for element in
-            soup.findAll('sense')]
+    for element in iter_elements(file, 'sense'):
+        yield element.attrib['id'], element.attrib['synset_id'], element.attrib['name']
+
+
+def parse_file(args):
+    parse_fn, file = args
+    return list(parse_fn(file))
+
+
+def iter_rows(parse_fn, files, pool=None):
+    """
+    rows of all files in file order, streamed from the files when no pool is given; pool workers parse a whole
+    file each, so the rows of up to one file per worker are held in memory
+    """
+    if pool is None:
+        for file in files:
+            yield from parse_fn(file)
+    else:
+        for rows in pool.imap(parse_file, [(parse_fn, file) for file in files]):
+            yield from rows
 
 
 def get_wordnet_files_from_path(path):
@@ -54,36 +76,99 @@ def get_wordnet_files_from_path(path):
 
 
 class RuWordnet(DatabaseRuWordnet):
-    def __init__(self, db_path, ruwordnet_path, with_lemmas=False):
-        super(RuWordnet, self).__init__(db_path)
-        self.__initialize_db(ruwordnet_path)
-        self.with_lemmas = with_lemmas
-
-    def __initialize_db(self, path):
+    def __init__(self, db_path, ruwordnet_path, with_lemmas=False, in_memory=False, n_jobs=1, read_only=False,
+                 wal=False, mmap_size=0):
+        """
+        :param n_jobs: processes parsing the xml files of a release when the database is built, by default
+        they are parsed in this process
+        :param read_only, wal, mmap_size: connection settings of DatabaseRuWordnet
+        """
+        # the pool is started before the database is opened, so no worker is forked with its connection
+        pool = multiprocessing.Pool(n_jobs) if n_jobs > 1 else None
+        try:
+            super(RuWordnet, self).__init__(db_path, read_only, wal, mmap_size)
+            self.with_lemmas = with_lemmas
+            self.__initialize_db(ruwordnet_path, pool)
+        finally:
+            if pool is not None:
+                pool.terminate()
+        self.graph = None
+        self.synsets_by_sense = None
+        if in_memory:
+            self.__load_graph()
+
+    def __initialize_db(self, path, pool=None):
         if self.is_empty():
+            if self.read_only:
+                raise Exception("Database is empty and opened read-only")
             print("Inserting data to database")
             synset_files, relation_files, senses_files = get_wordnet_files_from_path(path)
 
-            synsets = [synset for file in synset_files for synset in parse_synsets(file)]
-            relations = [relation for file in relation_files for relation in parse_relations(file)]
-
+            # one transaction, an interrupted build leaves the database empty
+            self.insert_synsets(iter_rows(parse_synsets, synset_files, pool), commit=False)
+            self.insert_relations(iter_rows(parse_relations, relation_files, pool), commit=False)
             if self.with_lemmas:
-                senses = [sense for file in synset_files for sense in parse_senses_lemmas(file)]
+                self.insert_senses(iter_rows(parse_senses_lemmas, synset_files, pool), commit=False)
             else:
-                senses = [sense for file in senses_files for sense in parse_senses(file)]
-
-            self.insert_synsets(synsets)
-            self.insert_relations(relations)
-            self.insert_senses(senses)
-
-
-#
-nouns_path = "D:/dialogue2020/taxonomy-enrichment/data/training_data/synsets_nouns.tsv"
-verbs_path = "D:/dialogue2020/taxonomy-enrichment/data/training_data/synsets_verbs.tsv"
-rwn_path = "D:/dialogue2020/dialogue2020_shared_task_hypernyms/dataset/ruwordnet.db"
-ruwordnet = RuWordnet(rwn_path, None)
-
-# print(ruwordnet)
-#
-# rwn_reader = RuWordNetReader(nouns_path, verbs_path, ruwordnet)
-# print(len(rwn_reader.get_data()))
\ No newline at end of file
+                self.insert_senses(iter_rows(parse_senses, senses_files, pool), commit=False)
+            self.conn.commit()
+
+    def __load_graph(self):
+        # hypernym lists keep the order of the relations primary key, hyponym lists the insertion order,
+        # same as the sql queries return them
+        synsets = self.cursor.execute('''SELECT id, ruthes_name FROM synsets ORDER BY rowid''').fetchall()
+        hypernym_edges = self.cursor.execute('''SELECT hypernym_id, hyponym_id FROM relations
+                                                ORDER BY hypernym_id, hyponym_id''').fetchall()
+        hyponym_edges = [(hyponym, hypernym) for hypernym, hyponym in
+                         self.cursor.execute('''SELECT hypernym_id, hyponym_id FROM relations ORDER BY rowid''')]
+        self.graph = TaxonomyGraph([i[0] for i in synsets], hypernym_edges, hyponym_edges, names=dict(synsets))
+        self.synsets_by_sense = {}
+        for sense_name, synset_id in self.cursor.execute('''SELECT sense_name, synset_id FROM senses ORDER BY rowid'''):
+            self.synsets_by_sense.setdefault(sense_name, synset_id)
+
+    def get_hypernyms_by_id(self, synset_id):
+        if self.graph is None:
+            return super(RuWordnet, self).get_hypernyms_by_id(synset_id)
+        return self.graph.get_hypernyms(synset_id)
+
+    def get_hyponyms_by_id(self, synset_id):
+        if self.graph is None:
+            return super(RuWordnet, self).get_hyponyms_by_id(synset_id)
+        return self.graph.get_hyponyms(synset_id)
+
+    def get_hypernyms_by_ids(self, synset_ids):
+        if self.graph is None:
+            return super(RuWordnet, self).get_hypernyms_by_ids(synset_ids)
+        return {synset_id: self.graph.get_hypernyms(synset_id) for synset_id in synset_ids}
+
+    def get_hyponyms_by_ids(self, synset_ids):
+        if self.graph is None:
+            return super(RuWordnet, self).get_hyponyms_by_ids(synset_ids)
+        return {synset_id: self.graph.get_hyponyms(synset_id) for synset_id in synset_ids}
+
+    def get_name_by_id(self, synset_id):
+        if self.graph is None:
+            return super(RuWordnet, self).get_name_by_id(synset_id)
+        return self.graph.get_name(synset_id)
+
+    def get_synset_by_sense(self, sense):
+        if self.synsets_by_sense is None:
+            return super(RuWordnet, self).get_synset_by_sense(sense)
+        return self.synsets_by_sense.get(sense, '')
+
+    def get_names_by_ids(self, synset_ids):
+        if self.graph is None:
+            return super(RuWordnet, self).get_names_by_ids(synset_ids)
+        return {synset_id: self.graph.get_name(synset_id) for synset_id in synset_ids}
+
+    def get_synsets_by_senses(self, senses):
+        if self.synsets_by_sense is None:
+            return super(RuWordnet, self).get_synsets_by_senses(senses)
+        return {sense: self.synsets_by_sense.get(sense, '') for sense in senses}
+
+
+if __name__ == '__main__':
+    nouns_path = "D:/dialogue2020/taxonomy-enrichment/data/training_data/synsets_nouns.tsv"
+    verbs_path = "D:/dialogue2020/taxonomy-enrichment/data/training_data/synsets_verbs.tsv"
+    rwn_path = "D:/dialogue2020/dialogue2020_shared_task_hypernyms/dataset/ruwordnet.db"
+    ruwordnet = RuWordnet(rwn_path, None)
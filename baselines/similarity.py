@@ -0,0 +1,69 @@
+import numpy as np
+
+
+def normalize_rows(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.sqrt((vectors ** 2).sum(-1))[..., np.newaxis]
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def rank_candidates(candidates, scores) -> list:
+    """
+    orders candidates by descending score, ties in the same order as reversed(sorted(...))
+    """
+    return [candidates[i] for i in np.argsort(scores, kind='stable')[::-1]]
+
+
+class EmbeddingMatrix:
+    """
+    L2-normalized KeyedVectors matrix with batched cosine nearest-neighbour search
+    """
+    def __init__(self, keyed_vectors, normalized=None):
+        """
+        :param normalized: already normalized rows of keyed_vectors (see embedding_store.load_normalized),
+        used as they are; otherwise a normalized copy of keyed_vectors.vectors is made
+        """
+        self.words = list(keyed_vectors.index2word)
+        self.index = {word: i for i, word in enumerate(self.words)}
+        self.vectors = normalize_rows(keyed_vectors.vectors) if normalized is None else normalized
+
+    def __contains__(self, word):
+        return word in self.index
+
+    def __len__(self):
+        return len(self.words)
+
+    def rows(self, words):
+        return self.vectors[[self.index[word] for word in words]].reshape(-1, self.vectors.shape[1])
+
+    def similarities(self, vector, words):
+        """
+        cosine similarities between one vector and the given words: one gather plus one matrix-vector product
+        """
+        return self.rows(words) @ normalize_rows(vector)
+
+    def mean_similarities(self, vectors, words):
+        """
+        cosine similarity of every word averaged over the rows of vectors
+        """
+        return (self.rows(words) @ normalize_rows(vectors).T).mean(1)
+
+    def most_similar(self, queries, topn=10, block_size=256) -> list:
+        """
+        :param queries: matrix with one query vector per row
+        :param block_size: number of queries multiplied against the matrix at once
+        :return: list of [(word, similarity), ...] sorted by similarity for every query
+        """
+        queries = normalize_rows(queries)
+        topn = min(topn, len(self.words))
+        result = []
+        for start in range(0, len(queries), block_size):
+            scores = queries[start:start + block_size] @ self.vectors.T
+            best = np.argpartition(-scores, topn - 1, axis=1)[:, :topn]
+            best_scores = np.take_along_axis(scores, best, axis=1)
+            order = np.argsort(-best_scores, axis=1)
+            best = np.take_along_axis(best, order, axis=1)
+            best_scores = np.take_along_axis(best_scores, order, axis=1)
+            result.extend([[(self.words[i], float(score)) for i, score in zip(row, row_scores)]
+                           for row, row_scores in zip(best, best_scores)])
+        return result
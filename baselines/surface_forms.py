@@ -0,0 +1,90 @@
+import argparse
+import json
+import pickle
+import re
+
+from taxonomy import TaxonomyFn, call_many, from_dict
+
+DELETE_BRACKETS = re.compile(r"\(.+?\)")
+
+
+def normalize_name(name) -> tuple:
+    """
+    lowercased comma-separated words of a taxonomy name with the bracketed parts removed
+    """
+    return tuple(word.lower() for word in DELETE_BRACKETS.sub("", name).split(','))
+
+
+class SurfaceForms:
+    """
+    synset id -> normalized words of its taxonomy name;
+    names of synsets missing from the table are normalized on first use and kept
+    """
+    def __init__(self, names=None):
+        self.names = names or {}
+
+    @classmethod
+    def build(cls, synsets, get_taxonomy_name_fn):
+        synsets = list(synsets)
+        return cls({synset: normalize_name(name)
+                    for synset, name in zip(synsets, call_many(get_taxonomy_name_fn, synsets))})
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            pickle.dump({"names": self.names}, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            forms = pickle.load(f)
+        return cls(forms["names"])
+
+    def add_names(self, synsets, get_taxonomy_name_fn):
+        """
+        normalizes the names of the synsets missing from the table with one bulk lookup
+        """
+        missing = [synset for synset in dict.fromkeys(synsets) if synset not in self.names]
+        for synset, name in zip(missing, call_many(get_taxonomy_name_fn, missing)):
+            self.names[synset] = normalize_name(name)
+
+    def get_name_words(self, synset, get_taxonomy_name_fn) -> tuple:
+        words = self.names.get(synset)
+        if words is None:
+            words = self.names[synset] = normalize_name(get_taxonomy_name_fn(synset))
+        return words
+
+
+def get_taxonomy_forms(params):
+    """
+    :return: all synset ids of the configured taxonomy and their name function
+    """
+    if params['language'] == 'en':
+        from nltk.corpus import WordNetCorpusReader
+        wn = WordNetCorpusReader(params["ruwordnet_path"], None)
+        return [synset.name() for synset in wn.all_synsets()], lambda x: x.split(".")[0].replace("_", " ")
+    elif params['language'] == 'ru':
+        from ruwordnet.ruwordnet_reader import RuWordnet
+        ruwordnet = RuWordnet(db_path=params["db_path"], ruwordnet_path=params["ruwordnet_path"], in_memory=True)
+        return ruwordnet.get_all_ids(), TaxonomyFn(ruwordnet.get_name_by_id, from_dict(ruwordnet.get_names_by_ids))
+    elif params['task'] == 'semeval':
+        from semeval2016_task13.semeval_taxonomy import SemEvalTaxonomy
+        taxonomy = SemEvalTaxonomy(taxonomy_path=params['taxonomy_path'], use_underscore=True)
+        return taxonomy.get_nodes(), lambda x: x
+    else:
+        raise Exception("task / language is not supported")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(prog='surface forms builder')
+    parser.add_argument('--config_path', type=str, dest="config_path", help='prediction config')
+    parser.add_argument('--output_path', type=str, dest="output_path", help='output .pickle path, '
+                                                                            'defaults to surface_forms_path of the config')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    # --config_path "configs/lr.json" --output_path "models/taxonomy/ruwordnet_forms.pickle"
+    args = parse_args()
+    with open(args.config_path, 'r', encoding='utf-8') as j:
+        params = json.load(j)
+    SurfaceForms.build(*get_taxonomy_forms(params)).save(args.output_path or params["surface_forms_path"])
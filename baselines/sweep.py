@@ -0,0 +1,220 @@
+import argparse
+import itertools
+import json
+import os
+from collections import defaultdict
+
+import numpy as np
+
+import predict_models
+from prediction_writer import RUNTIME_KEYS, get_config_hash
+from scoring_program.scoring import EncodedReference, mean
+from scoring_program.utils import read_reference
+
+# config keys that change how the features are scored but not the features themselves
+SWEEP_KEYS = RUNTIME_KEYS + ("weights", "vote_params", "output_path", "features_path")
+# per-candidate arrays of extract_features besides the features
+CANDIDATE_KEYS = ("in_hchs",)
+
+
+class FeatureCache:
+    """
+    candidates and raw features of every neologism extracted once by extract_features of a model and concatenated
+    over all neologisms, so that a weight configuration is scored for all of them with a few array operations
+    """
+    def __init__(self, model_name, words, extracted, offsets, config_hash=""):
+        """
+        :param extracted: extract_features result with the candidates and arrays of all words concatenated,
+        vote edges point into the concatenated candidates and associates
+        :param offsets: word i owns candidates offsets[i]:offsets[i + 1]
+        """
+        self.model_name = model_name
+        self.words = words
+        self.extracted = extracted
+        self.offsets = offsets
+        self.config_hash = config_hash
+
+    @classmethod
+    def build(cls, model, neologisms, taxonomy_fns, topn=10, config_hash=""):
+        words = list(dict.fromkeys(neologisms))
+        candidates, sizes = [], []
+        features, arrays = defaultdict(list), defaultdict(list)
+        n_associates = 0
+        for word, extracted in model.iter_features(words, *taxonomy_fns, topn):
+            if "vote_edges" in extracted:
+                slots, sources, second_order = extracted["vote_edges"]
+                arrays["vote_slots"].append(slots + len(candidates))
+                arrays["vote_sources"].append(sources + n_associates)
+                arrays["vote_second_order"].append(second_order)
+                arrays["associate_similarities"].append(extracted["associate_similarities"])
+                n_associates += len(extracted["associate_similarities"])
+            for key in CANDIDATE_KEYS:
+                if key in extracted:
+                    arrays[key].append(extracted[key])
+            for name, values in extracted["features"].items():
+                features[name].append(values)
+            candidates.extend(extracted["candidates"])
+            sizes.append(len(extracted["candidates"]))
+        offsets = np.zeros(len(sizes) + 1, dtype=np.int64)
+        np.cumsum(sizes, out=offsets[1:])
+        arrays = {key: np.concatenate(values) for key, values in arrays.items()}
+        features = {name: np.concatenate(values) for name, values in features.items()}
+        return cls(type(model).__name__, words, to_extracted(candidates, features, arrays), offsets, config_hash)
+
+    def save(self, path):
+        arrays = {f"feature_{name}": values for name, values in self.extracted["features"].items()}
+        if "vote_edges" in self.extracted:
+            arrays["vote_slots"], arrays["vote_sources"], arrays["vote_second_order"] = self.extracted["vote_edges"]
+            arrays["associate_similarities"] = self.extracted["associate_similarities"]
+        for key in CANDIDATE_KEYS:
+            if key in self.extracted:
+                arrays[key] = self.extracted[key]
+        np.savez(path, model_name=self.model_name, config_hash=self.config_hash, words=np.array(self.words),
+                 candidates=np.array(self.extracted["candidates"]), offsets=self.offsets, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        cache = np.load(path)
+        features = {key[len("feature_"):]: cache[key] for key in cache.files if key.startswith("feature_")}
+        arrays = {key: cache[key] for key in cache.files
+                  if key in CANDIDATE_KEYS or key.startswith("vote_") or key == "associate_similarities"}
+        return cls(str(cache['model_name']), cache['words'].tolist(),
+                   to_extracted(cache['candidates'].tolist(), features, arrays), cache['offsets'],
+                   str(cache['config_hash']))
+
+
+def to_extracted(candidates, features, arrays) -> dict:
+    extracted = {"candidates": candidates, "features": features}
+    if "vote_slots" in arrays:
+        extracted["vote_edges"] = (arrays["vote_slots"].astype(np.int64), arrays["vote_sources"].astype(np.int64),
+                                   arrays["vote_second_order"].astype(bool))
+        extracted["associate_similarities"] = arrays["associate_similarities"]
+    for key in CANDIDATE_KEYS:
+        if key in arrays:
+            extracted[key] = arrays[key]
+    return extracted
+
+
+class Sweep:
+    """
+    scores weight configurations of a FeatureCache against a reference: candidates of all words are scored at
+    once with score_features of the model, ranked as a padded [words, candidates] matrix and evaluated
+    without building prediction lists
+    """
+    def __init__(self, cache, true, k=10):
+        self.model_class = getattr(predict_models, cache.model_name)
+        self.cache = cache
+        self.reference = EncodedReference(true, k)
+        sizes = np.diff(cache.offsets)
+        n_words = len(cache.words)
+        self.rows = np.repeat(np.arange(n_words), sizes)
+        self.columns = np.arange(len(cache.extracted["candidates"])) - np.repeat(cache.offsets[:-1], sizes)
+        self.shape = (n_words, max(int(sizes.max()) if n_words else 0, k))
+        self.synsets = np.full(self.shape, -1, dtype=np.int64)
+        self.synsets[self.rows, self.columns] = [self.reference.ids.get(candidate, -1)
+                                                 for candidate in cache.extracted["candidates"]]
+        index = {word: i for i, word in enumerate(cache.words)}
+        self.reference_rows = np.array([index.get(word, -1) for word in self.reference.words], dtype=np.int64)
+
+    def encode(self, weights, vote_params=None):
+        """
+        :return: ranked predictions encoded as EncodedReference.encode would encode them
+        """
+        features, ranked = self.model_class.prepare_features(self.cache.extracted, vote_params)
+        scores = np.full(self.shape, -np.inf)
+        scores[self.rows, self.columns] = self.model_class.score_features(features, weights)
+        valid = np.zeros(self.shape, dtype=bool)
+        valid[self.rows, self.columns] = True if ranked is None else ranked
+        scores[~valid] = -np.inf
+        if self.model_class.RANKING == "most_common":
+            order = np.argsort(-scores, axis=1, kind='stable')
+        else:
+            order = np.argsort(scores, axis=1, kind='stable')[:, ::-1]
+        order = order[:, :self.reference.k]
+        predicted = np.where(np.take_along_axis(valid, order, 1), np.take_along_axis(self.synsets, order, 1), -1)
+
+        encoded = np.full((len(self.reference.words), self.reference.k), -1, dtype=np.int64)
+        known = self.reference_rows >= 0
+        encoded[known] = predicted[self.reference_rows[known]]
+        return encoded
+
+    def evaluate(self, weights=None, vote_params=None):
+        """
+        :return: MAP and MRR of the weights, weights missing from them are taken from the model defaults
+        """
+        weights = dict(self.model_class.WEIGHTS, **(weights or {}))
+        ap, rr = self.reference.score_encoded(self.encode(weights, vote_params))
+        return mean(ap), mean(rr)
+
+
+def expand_grid(grid) -> list:
+    """
+    {"weights": {"name": [values]}, "vote_params": {"name": [values]}} -> list of every combination of values
+    """
+    keys = [(group, name) for group in ("weights", "vote_params") for name in grid.get(group, {})]
+    configs = []
+    for values in itertools.product(*[grid[group][name] for group, name in keys]):
+        config = {"weights": {}, "vote_params": {}}
+        for (group, name), value in zip(keys, values):
+            config[group][name] = value
+        configs.append(config)
+    return configs
+
+
+def run_sweep(sweep, configs, weights=None, vote_params=None) -> list:
+    """
+    :param weights, vote_params: values of the parameters a config does not set
+    :return: (map, mrr, config) of every config, best map first
+    """
+    results = []
+    for config in configs:
+        mean_ap, mean_rr = sweep.evaluate(dict(weights or {}, **config["weights"]),
+                                          dict(vote_params or {}, **config["vote_params"]))
+        results.append((mean_ap, mean_rr, config))
+    return sorted(results, key=lambda result: -result[0])
+
+
+def get_feature_cache(params, features_path=None):
+    """
+    features of the configured model, loaded from features_path if they were extracted with the same config
+    """
+    config_hash = get_config_hash({key: value for key, value in params.items() if key not in SWEEP_KEYS})
+    if features_path and os.path.exists(features_path):
+        cache = FeatureCache.load(features_path)
+        if cache.config_hash == config_hash:
+            return cache
+    from main import MODELS, generate_taxonomy_fns, read_test_data
+    model = MODELS[params["model"]](params)
+    cache = FeatureCache.build(model, read_test_data(params), generate_taxonomy_fns(params, model),
+                               params.get("topn", 10), config_hash)
+    if features_path:
+        cache.save(features_path)
+    return cache
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(prog='weight sweep')
+    parser.add_argument('--config_path', type=str, dest="config_path", help='prediction config with gold_path')
+    parser.add_argument('--grid_path', type=str, dest="grid_path", help='json with lists of weights and vote_params')
+    parser.add_argument('--features_path', type=str, dest="features_path", help='.npz cache of the features, '
+                                                                                'defaults to features_path of the config')
+    parser.add_argument('--output_path', type=str, dest="output_path", help='.tsv with the score of every config')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    # --config_path "configs/lr.json" --grid_path "configs/lr_grid.json" --features_path "models/lr_features.npz"
+    args = parse_args()
+    with open(args.config_path, 'r', encoding='utf-8') as j:
+        params = json.load(j)
+    with open(args.grid_path, 'r', encoding='utf-8') as j:
+        grid = json.load(j)
+    cache = get_feature_cache(params, args.features_path or params.get("features_path"))
+    sweep = Sweep(cache, read_reference(params["gold_path"]))
+    results = run_sweep(sweep, expand_grid(grid), params.get("weights"), params.get("vote_params"))
+    if args.output_path:
+        with open(args.output_path, 'w', encoding='utf-8') as f:
+            for mean_ap, mean_rr, config in results:
+                f.write(f"{mean_ap}\t{mean_rr}\t{json.dumps(config, sort_keys=True)}\n")
+    for mean_ap, mean_rr, config in results[:10]:
+        print(f"map: {mean_ap}\tmrr: {mean_rr}\t{json.dumps(config, sort_keys=True)}")
@@ -0,0 +1,65 @@
+class TaxonomyFn:
+    """
+    taxonomy function of generate_taxonomy_fns: a lookup of a single id with a bulk form for a list of ids,
+    the same for all taxonomy backends
+    """
+    def __init__(self, fn, many=None):
+        """
+        :param fn: id -> result
+        :param many: list of ids -> list of results in the same order, fn is called for every id by default
+        """
+        self.fn = fn
+        self.many_fn = many
+
+    def __call__(self, item):
+        return self.fn(item)
+
+    def many(self, items) -> list:
+        if self.many_fn is None:
+            return [self.fn(item) for item in items]
+        return self.many_fn(items)
+
+
+def call_many(fn, items) -> list:
+    """
+    [fn(item) for item in items] in one call of the backend if fn has a bulk form
+    """
+    items = list(items)
+    if not items:
+        return []
+    if hasattr(fn, "many"):
+        return fn.many(items)
+    return [fn(item) for item in items]
+
+
+def chain_many(fn, items) -> list:
+    """
+    results of fn for all items concatenated, e.g. all hypernyms of a list of associates
+    """
+    return [result for results in call_many(fn, items) for result in results]
+
+
+def from_dict(many) -> callable:
+    """
+    bulk lookup that returns a dict by id -> bulk lookup that returns a list in the order of the ids
+    """
+    def get_many(items):
+        results = many(items)
+        return [results[item] for item in items]
+    return get_many
+
+
+def get_ancestors_many(get_hypernym_fn, items, depth=2) -> list:
+    """
+    :return: for every item the lists of its ancestors at depth 1, 2, ... depth, with one entry for every path;
+    every depth is looked up for all items in one call_many
+    """
+    frontiers = [[item] for item in items]
+    ancestors = [[] for _ in frontiers]
+    for _ in range(depth):
+        nodes = list(dict.fromkeys(node for frontier in frontiers for node in frontier))
+        parents = dict(zip(nodes, call_many(get_hypernym_fn, nodes)))
+        frontiers = [[parent for node in frontier for parent in parents[node]] for frontier in frontiers]
+        for item_ancestors, frontier in zip(ancestors, frontiers):
+            item_ancestors.append(frontier)
+    return ancestors
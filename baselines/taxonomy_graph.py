@@ -0,0 +1,114 @@
+import numpy as np
+
+
+def build_csr(sources, targets, size):
+    """
+    :param sources: int array of edge sources
+    :param targets: int array of edge targets, neighbours of a node keep the order they are given in
+    :return: (indptr, indices) so that neighbours of node i are indices[indptr[i]:indptr[i + 1]]
+    """
+    order = np.argsort(sources, kind='stable')
+    indptr = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=size), out=indptr[1:])
+    return indptr, np.asarray(targets, dtype=np.int32)[order]
+
+
+# arrays of a saved graph, any other array of the file is passed to save by the caller
+GRAPH_KEYS = ("ids", "names", "hypernyms_indptr", "hypernyms_indices", "hyponyms_indptr", "hyponyms_indices",
+              "senses_indptr", "senses")
+
+
+class TaxonomyGraph:
+    """
+    in-memory taxonomy: ids interned to ints, hypernym and hyponym adjacency in CSR arrays, a name table and
+    sense lists; saved to and loaded from a single .npz
+    """
+    def __init__(self, ids, hypernym_edges, hyponym_edges=None, names=None, senses=None):
+        """
+        :param ids: all node ids
+        :param hypernym_edges: (node, hypernym) pairs, hypernyms of a node are returned in this order
+        :param hyponym_edges: (node, hyponym) pairs, defaults to the reversed hypernym edges
+        :param names: dict node -> name
+        :param senses: dict node -> list of sense names
+        """
+        self.ids = list(ids)
+        self.index = {_id: i for i, _id in enumerate(self.ids)}
+        hypernym_edges = self.__intern(hypernym_edges)
+        if hyponym_edges is None:
+            hyponym_edges = hypernym_edges[:, ::-1]
+        else:
+            hyponym_edges = self.__intern(hyponym_edges)
+        self.hypernyms = build_csr(hypernym_edges[:, 0], hypernym_edges[:, 1], len(self.ids))
+        self.hyponyms = build_csr(hyponym_edges[:, 0], hyponym_edges[:, 1], len(self.ids))
+        names = names or {}
+        self.names = [names.get(_id, '') for _id in self.ids]
+        senses = senses or {}
+        self.senses = [list(senses.get(_id, [])) for _id in self.ids]
+        self.arrays = {}
+
+    def __intern(self, edges):
+        interned = []
+        for source, target in edges:
+            for _id in (source, target):
+                if _id not in self.index:
+                    self.index[_id] = len(self.ids)
+                    self.ids.append(_id)
+            interned.append((self.index[source], self.index[target]))
+        return np.array(interned, dtype=np.int64).reshape(-1, 2)
+
+    def save(self, path, **arrays):
+        """
+        :param arrays: other arrays stored in the same file, kept in arrays by load
+        """
+        sense_indptr = np.zeros(len(self.ids) + 1, dtype=np.int64)
+        np.cumsum([len(senses) for senses in self.senses], out=sense_indptr[1:])
+        np.savez(path, ids=np.array(self.ids, dtype=str), names=np.array(self.names, dtype=str),
+                 hypernyms_indptr=self.hypernyms[0], hypernyms_indices=self.hypernyms[1],
+                 hyponyms_indptr=self.hyponyms[0], hyponyms_indices=self.hyponyms[1],
+                 senses_indptr=sense_indptr,
+                 senses=np.array([sense for senses in self.senses for sense in senses], dtype=str), **arrays)
+
+    @classmethod
+    def load(cls, path):
+        graph = np.load(path)
+        taxonomy = cls.__new__(cls)
+        taxonomy.ids = graph['ids'].tolist()
+        taxonomy.index = {_id: i for i, _id in enumerate(taxonomy.ids)}
+        taxonomy.hypernyms = (graph['hypernyms_indptr'], graph['hypernyms_indices'])
+        taxonomy.hyponyms = (graph['hyponyms_indptr'], graph['hyponyms_indices'])
+        taxonomy.names = graph['names'].tolist()
+        senses, sense_indptr = graph['senses'].tolist(), graph['senses_indptr'].tolist()
+        taxonomy.senses = [senses[start:end] for start, end in zip(sense_indptr, sense_indptr[1:])]
+        taxonomy.arrays = {key: graph[key] for key in graph.files if key not in GRAPH_KEYS}
+        return taxonomy
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, _id):
+        return _id in self.index
+
+    @staticmethod
+    def neighbour_ids(csr, i):
+        indptr, indices = csr
+        return indices[indptr[i]:indptr[i + 1]]
+
+    def __neighbours(self, csr, _id):
+        i = self.index.get(_id)
+        if i is None:
+            return []
+        return [self.ids[j] for j in self.neighbour_ids(csr, i).tolist()]
+
+    def get_hypernyms(self, _id):
+        return self.__neighbours(self.hypernyms, _id)
+
+    def get_hyponyms(self, _id):
+        return self.__neighbours(self.hyponyms, _id)
+
+    def get_name(self, _id):
+        i = self.index.get(_id)
+        return self.names[i] if i is not None else ''
+
+    def get_senses(self, _id):
+        i = self.index.get(_id)
+        return list(self.senses[i]) if i is not None else []
@@ -1,4 +1,7 @@
 import argparse
+import hashlib
+import multiprocessing
+import os
 from gensim.models import KeyedVectors
 from tqdm import tqdm
 import numpy as np
@@ -6,75 +9,222 @@ import json
 
 from vectorizers.bert_model import BertPretrained
 
+# the longest input BERT takes without [CLS] and [SEP]
+MAX_SUBWORDS = 510
+
+
+class ContextAccumulator:
+    """
+    running sums and counts of context vectors in preallocated float32 arrays indexed by word number,
+    with the byte offset of the occurrences file they cover so far
+    """
+    def __init__(self, words, dim, start=0, end=None):
+        self.words = list(words)
+        self.index = {word: i for i, word in enumerate(self.words)}
+        self.sums = np.zeros((len(self.words), dim), dtype=np.float32)
+        self.counts = np.zeros(len(self.words), dtype=np.int64)
+        self.start = start
+        self.end = end
+        self.position = start
+        # checkpoints are only restored into an accumulator over the same word list
+        self.words_hash = hashlib.md5("\n".join(self.words).encode('utf-8')).hexdigest()
+
+    def add(self, words, vectors):
+        """
+        adds the vectors of known words, vectors with nan are skipped
+        """
+        rows = [(self.index[word], i) for i, word in enumerate(words) if word in self.index]
+        if not rows:
+            return
+        indices, positions = map(list, zip(*rows))
+        vectors = np.asarray(vectors, dtype=np.float32)[positions]
+        valid = ~np.isnan(vectors).any(1)
+        indices = np.array(indices)[valid]
+        np.add.at(self.sums, indices, vectors[valid])
+        np.add.at(self.counts, indices, 1)
+
+    def save(self, path):
+        # written next to path and renamed, so an interrupted save leaves the previous checkpoint
+        with open(path + ".tmp", 'wb') as f:
+            np.savez(f, sums=self.sums, counts=self.counts, start=self.start, end=self.end, position=self.position,
+                     n_words=len(self.words), words_hash=self.words_hash)
+        os.replace(path + ".tmp", path)
+
+    def restore(self, path):
+        checkpoint = np.load(path)
+        if int(checkpoint['start']) != self.start or int(checkpoint['end']) != self.end:
+            raise Exception(f"{path} covers another byte range, restart with the same number of shards")
+        if 'words_hash' not in checkpoint or int(checkpoint['n_words']) != len(self.words) or \
+                str(checkpoint['words_hash']) != self.words_hash:
+            raise Exception(f"{path} was accumulated for another word list, restart with the same vectors_path "
+                            f"or another checkpoint_dir")
+        self.sums = checkpoint['sums']
+        self.counts = checkpoint['counts']
+        self.position = int(checkpoint['position'])
+
+
+def split_byte_ranges(path, n_shards):
+    """
+    :return: (start, end) byte ranges of about the same size that start at the beginning of a line
+    """
+    size = os.path.getsize(path)
+    starts = [0]
+    with open(path, 'rb') as f:
+        for i in range(1, n_shards):
+            f.seek(max(size * i // n_shards - 1, starts[-1]))
+            f.readline()
+            starts.append(max(f.tell(), starts[-1]))
+    return [(start, end) for start, end in zip(starts, starts[1:] + [size]) if start < end]
+
 
 class BertContextVectorizer:
-    def __init__(self, model_path):
-        self.bert = BertPretrained(model_path)
+    def __init__(self, model_path, device=None, batch_size=32):
+        self.bert = BertPretrained(model_path, device, batch_size)
 
     # -------------------------------------------------------------
     # update vectors
     # -------------------------------------------------------------
 
-    def update_vectors(self, current_vectors, text_path, output_path, batch_size):
-        counter = 0
+    def update_vectors(self, current_vectors, text_path, output_path, batch_size, checkpoint_dir=None):
+        accumulator = ContextAccumulator(current_vectors, get_dim(current_vectors), 0, os.path.getsize(text_path))
+        checkpoint_path = get_checkpoint_path(checkpoint_dir, 0)
+        self.accumulate(accumulator, text_path, batch_size, checkpoint_path)
+        save_as_w2v_mean(current_vectors, accumulator, output_path)
+
+    def accumulate(self, accumulator, text_path, batch_size, checkpoint_path=None, checkpoint_every=100):
+        """
+        adds the context vectors of the occurrences in the byte range of accumulator, continuing from its
+        checkpoint; the checkpoint is saved every checkpoint_every batches
+        """
+        if checkpoint_path and os.path.exists(checkpoint_path):
+            accumulator.restore(checkpoint_path)
         batch = []
         position_batch = []
+        n_batches = 0
 
-        with open(text_path, 'r', encoding='utf-8') as f:
-            for line in tqdm(f):
-                counter += 1
+        with open(text_path, 'rb') as f:
+            f.seek(accumulator.position)
+            position = accumulator.position
+            progress = tqdm(total=accumulator.end - accumulator.start, initial=position - accumulator.start,
+                            unit='B', unit_scale=True)
+            while position < accumulator.end:
+                line = f.readline()
+                if not line:
+                    break
+                position += len(line)
+                progress.update(len(line))
                 tokens, positions = json.loads(line)
-                tokens = tokens.split()
-                if len(self.bert.tokenize(tokens)[0]) > 510:
-                    continue
-                batch.append(tokens)
-                position_batch.append(positions)
-                if counter % batch_size == 0:
-                    for word, vector in self.get_vectors(batch, position_batch):
-                        if not any(np.isnan(vector)) and word in current_vectors:
-                                current_vectors[word][0] = current_vectors[word][0] + vector
-                                current_vectors[word][1] += 1
+                # tokenized once for both the length limit and vectorization
+                tokenized = self.bert.tokenize(tokens.split())
+                if len(tokenized[0]) <= MAX_SUBWORDS:
+                    batch.append(tokenized)
+                    position_batch.append(positions)
+                if len(batch) == batch_size:
+                    self.add_batch(accumulator, batch, position_batch)
                     batch = []
                     position_batch = []
+                    accumulator.position = position
+                    n_batches += 1
+                    if checkpoint_path and n_batches % checkpoint_every == 0:
+                        accumulator.save(checkpoint_path)
+            progress.close()
 
-            for word, vector in self.get_vectors(batch, position_batch):
-                if not any(np.isnan(vector)) and word in current_vectors:
-                        current_vectors[word][0] = current_vectors[word][0] + vector
-                        current_vectors[word][1] += 1
+        self.add_batch(accumulator, batch, position_batch)
+        accumulator.position = position
+        if checkpoint_path:
+            accumulator.save(checkpoint_path)
+        return accumulator
 
-        self.save_as_w2v_mean(current_vectors, output_path)
+    def add_batch(self, accumulator, batch, position_batch):
+        word_vectors = self.get_vectors(batch, position_batch) if batch else []
+        if word_vectors:
+            words, vectors = zip(*word_vectors)
+            accumulator.add(words, vectors)
 
     # -------------------------------------------------------------
     # get vectors
     # -------------------------------------------------------------
 
-    def get_vectors(self, sentences, indices):
+    def get_vectors(self, tokenized, indices):
+        """
+        :param tokenized: sentences passed through BertPretrained.tokenize
+        """
         word_vectors = []
-        batch = self.bert.vectorize_sentences(sentences)
+        batch = self.bert.vectorize_tokenized(tokenized)
 
-        for sent_vectors, tokens, sent_indices in zip(batch, sentences, indices):
-            assert sent_vectors.shape[0] == len(tokens)
-            word_vectors.extend([(synset, self.get_avg_vector(sent_vectors, borders, synset, tokens))
+        for sent_vectors, (_, _, mapping), sent_indices in zip(batch, tokenized, indices):
+            assert sent_vectors.shape[0] == len(mapping) - 1
+            word_vectors.extend([(synset, self.get_avg_vector(sent_vectors, borders))
                                  for synset, borders in sent_indices])
         return word_vectors
 
     @staticmethod
-    def get_avg_vector(vectors, borders, s, t):
+    def get_avg_vector(vectors, borders):
         start, end = borders
         return np.mean(vectors[start:end], 0)
 
-    # -------------------------------------------------------------
-    # save vectors
-    # -------------------------------------------------------------
 
-    @staticmethod
-    def save_as_w2v_mean(dictionary, output_path):
-        with open(output_path, 'w', encoding='utf-8') as w:
-            w.write(f"{len(dictionary)} {list(dictionary.values())[0][0].shape[-1]}\n")
-            for word, (vector, count) in dictionary.items():
-                mean_vector = vector / count if count != 0 else vector
-                vector_line = " ".join(map(str, mean_vector))
-                w.write(f"{word.upper()} {vector_line}\n")
+# -------------------------------------------------------------
+# sharded passes
+# -------------------------------------------------------------
+
+def get_checkpoint_path(checkpoint_dir, shard):
+    if not checkpoint_dir:
+        return None
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    return os.path.join(checkpoint_dir, f"shard_{shard}.npz")
+
+
+def accumulate_shard(args):
+    shard, (start, end), words, dim, bert_path, device, batch_size, text_path, checkpoint_dir = args
+    vectorizer = BertContextVectorizer(bert_path, device, batch_size)
+    accumulator = ContextAccumulator(words, dim, start, end)
+    vectorizer.accumulate(accumulator, text_path, batch_size, get_checkpoint_path(checkpoint_dir, shard))
+    return accumulator.sums, accumulator.counts
+
+
+def update_vectors_sharded(current_vectors, bert_path, text_path, output_path, batch_size, n_jobs, devices=None,
+                           checkpoint_dir=None):
+    """
+    every worker accumulates the context vectors of one byte range of text_path, the sums and counts
+    are added up at the end; workers are given the devices in turn
+    """
+    devices = devices or [None]
+    words = list(current_vectors)
+    dim = get_dim(current_vectors)
+    ranges = split_byte_ranges(text_path, n_jobs)
+    tasks = [(shard, byte_range, words, dim, bert_path, devices[shard % len(devices)], batch_size, text_path,
+              checkpoint_dir) for shard, byte_range in enumerate(ranges)]
+    accumulator = ContextAccumulator(words, dim)
+    # cuda can not be used in forked processes
+    with multiprocessing.get_context('spawn').Pool(n_jobs) as pool:
+        for sums, counts in pool.imap_unordered(accumulate_shard, tasks):
+            accumulator.sums += sums
+            accumulator.counts += counts
+    save_as_w2v_mean(current_vectors, accumulator, output_path)
+
+
+# -------------------------------------------------------------
+# save vectors
+# -------------------------------------------------------------
+
+def save_as_w2v_mean(current_vectors, accumulator, output_path):
+    """
+    means of the current vectors, weighted by their counts, and the accumulated context vectors
+    """
+    with open(output_path, 'w', encoding='utf-8') as w:
+        w.write(f"{len(current_vectors)} {get_dim(current_vectors)}\n")
+        for word, (vector, count) in current_vectors.items():
+            i = accumulator.index[word]
+            count = count + accumulator.counts[i]
+            vector = vector + accumulator.sums[i]
+            mean_vector = vector / count if count != 0 else vector
+            vector_line = " ".join(map(str, mean_vector))
+            w.write(f"{word.upper()} {vector_line}\n")
+
+
+def get_dim(current_vectors):
+    return list(current_vectors.values())[0][0].shape[-1]
 
 
 def get_vectors(filepath):
@@ -89,6 +239,12 @@ def parse_args():
     parser.add_argument('--output_path', type=str, dest="output_path", help='output_path')
     parser.add_argument('--texts_dir', type=str, dest="texts_dir", help='texts_dir')
     parser.add_argument('--batch_size', type=int, dest='batch_size', help='batch size', default=16)
+    parser.add_argument('--device', type=str, dest="device", help='torch device, e.g. cpu; cuda if available; '
+                                                                 'comma-separated devices are given to the workers')
+    parser.add_argument('--n_jobs', type=int, dest="n_jobs", help='workers, each reads a part of texts_dir',
+                        default=1)
+    parser.add_argument('--checkpoint_dir', type=str, dest="checkpoint_dir",
+                        help='partial sums of every worker, an interrupted run continues from them')
     return parser.parse_args()
 
 
@@ -97,9 +253,14 @@ if __name__ == '__main__':
     # --texts_dir "models/parsed_sentences_with_occurrences"
     # --vectors_path "models/vectors/bert/ru/tokens/nouns_public.txt"
     # --output_path "models/vectors/bert/ru/tokens/nouns_public_context.txt"
+    # --n_jobs 2 --device "cuda:0,cuda:1" --checkpoint_dir "models/vectors/bert/ru/tokens/checkpoints"
     args = parse_args()
-    bcv = BertContextVectorizer(args.bert_path)
     vectors = get_vectors(args.vectors_path)
-
     print(f"Processing {args.texts_dir}")
-    bcv.update_vectors(vectors, args.texts_dir, args.output_path, args.batch_size)
+    devices = args.device.split(",") if args.device else None
+    if args.n_jobs > 1:
+        update_vectors_sharded(vectors, args.bert_path, args.texts_dir, args.output_path, args.batch_size,
+                               args.n_jobs, devices, args.checkpoint_dir)
+    else:
+        bcv = BertContextVectorizer(args.bert_path, devices[0] if devices else None, args.batch_size)
+        bcv.update_vectors(vectors, args.texts_dir, args.output_path, args.batch_size, args.checkpoint_dir)
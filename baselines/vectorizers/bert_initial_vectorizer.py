@@ -11,17 +11,19 @@ from fasttext_vectorize_en import compute_synsets_from_wordnets
 
 
 class BertVectorizer:
-    def __init__(self, model_path):
-        self.bert = BertPretrained(model_path)
+    def __init__(self, model_path, device=None, batch_size=32):
+        self.bert = BertPretrained(model_path, device, batch_size)
 
     # -------------------------------------------------------------
     # get ruwordnet
     # -------------------------------------------------------------
 
     def vectorize_groups(self, synsets, output_path, to_upper=True):
-        vectors = {synset: np.mean([np.mean(sentence_vectors, 0) for sentence_vectors in
-                                    self.bert.vectorize_sentences([i.split() for i in texts])], 0)
-                   for synset, texts in tqdm(synsets.items())}
+        # texts of all synsets are vectorized together, so that batches hold texts of similar length
+        texts = [text.split() for synset_texts in synsets.values() for text in synset_texts]
+        batch = iter(self.bert.vectorize_sentences(texts))
+        vectors = {synset: np.mean([np.mean(next(batch), 0) for _ in synset_texts], 0)
+                   for synset, synset_texts in tqdm(synsets.items())}
         self.save_as_w2v(vectors, output_path, to_upper)
 
     # -------------------------------------------------------------
@@ -29,7 +31,7 @@ class BertVectorizer:
     # -------------------------------------------------------------
 
     def vectorize_data(self, data, output_path, upper):
-        batch = [self.bert.vectorize_sentences([d.split("_")])[0] for d in tqdm(data)]
+        batch = self.bert.vectorize_sentences([d.split("_") for d in data])
         vectors = {word: np.mean(sentence_vectors, 0) for sentence_vectors, word in zip(batch, data)}
         self.save_as_w2v(vectors, output_path, upper=upper)
 
@@ -61,6 +63,8 @@ def parse_args():
     parser = argparse.ArgumentParser(prog='PROG')
     parser.add_argument('--bert_path', type=str, dest="bert_path", help='bert model dir')
     parser.add_argument('--output_path', type=str, dest="output_path", help='output_path')
+    parser.add_argument('--device', type=str, dest="device", help='torch device, e.g. cpu; cuda if available')
+    parser.add_argument('--batch_size', type=int, dest='batch_size', help='sentences per forward pass', default=32)
     subparsers = parser.add_subparsers(help='sub-command help')
 
     # create the parser for the "wordnet" command
@@ -84,7 +88,7 @@ def parse_args():
 
 if __name__ == '__main__':
     args = parse_args()
-    bert_vectorizer = BertVectorizer(args.bert_path)
+    bert_vectorizer = BertVectorizer(args.bert_path, args.device, args.batch_size)
 
     if 'ruwordnet_path' in args:
         ruwordnet = RuWordnet(args.ruwordnet_path, None)
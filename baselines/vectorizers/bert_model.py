@@ -1,52 +1,104 @@
 import numpy as np
-from tensorflow.keras.preprocessing.sequence import pad_sequences
 import torch
 
-device = torch.device('cuda')
-n_gpu = torch.cuda.device_count()
-
-for i in range(n_gpu):
-    print(torch.cuda.get_device_name(i))
-
 torch.manual_seed(117)
 
 from pytorch_pretrained_bert import BertTokenizer, BertModel
 
 
+def get_device(device=None):
+    """
+    cuda if it is available and no device is given, "cpu" runs without a gpu
+    """
+    if device is None:
+        device = 'cuda' if torch.cuda.is_available() else 'cpu'
+    return torch.device(device)
+
+
+def pad(sequences, length):
+    padded = np.zeros((len(sequences), length), dtype=np.int64)
+    for i, sequence in enumerate(sequences):
+        padded[i, :len(sequence)] = sequence
+    return padded
+
+
+def segment_means(embeddings, mappings):
+    """
+    mean subword vector of every original token of a batch
+    :param embeddings: [batch, subwords, dim] array
+    :param mappings: for every sentence the subword index each token starts at, followed by the end of the last one
+    :return: [tokens, dim] array for every sentence, tokens without subwords are nan
+    """
+    n_subwords = embeddings.shape[1]
+    boundaries = np.concatenate([i * n_subwords + np.asarray(mapping, dtype=np.int64)
+                                 for i, mapping in enumerate(mappings)])
+    flat = embeddings.reshape(-1, embeddings.shape[2])
+    # sums between consecutive boundaries: the tokens of a sentence followed by the gap to the next sentence
+    sums = np.add.reduceat(flat, boundaries, axis=0)
+    counts = np.diff(boundaries)
+    result = []
+    start = 0
+    for mapping in mappings:
+        n_tokens = len(mapping) - 1
+        token_counts = counts[start:start + n_tokens]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = sums[start:start + n_tokens] / token_counts[:, None]
+        means[token_counts == 0] = np.nan
+        result.append(means.astype(np.float64))
+        start += n_tokens + 1
+    return result
+
+
 class BertPretrained:
-    def __init__(self, model_path):
+    def __init__(self, model_path, device=None, batch_size=32):
+        """
+        :param device: torch device name, cuda if available by default
+        :param batch_size: sentences per forward pass of vectorize_sentences
+        """
+        self.device = get_device(device)
+        self.batch_size = batch_size
+        if self.device.type == 'cuda':
+            for i in range(torch.cuda.device_count()):
+                print(torch.cuda.get_device_name(i))
         self.tokenizer = BertTokenizer.from_pretrained(model_path)
         self.model = BertModel.from_pretrained(model_path)
-        self.model.cuda('cuda')
+        self.model.to(self.device)
         self.model.eval()
 
     def vectorize_sentences(self, sentences):
-        result_batch = []
-        indexed_batch = []
-        segment_batch = []
-        mapping = []
-        for sentence in sentences:
-            tokens, ids, map_to_tok = self.tokenize(sentence)
-            indexed_batch.append(tokens)
-            segment_batch.append(ids)
-            mapping.append(map_to_tok)
-
-        tokens_tensor = torch.LongTensor(pad_sequences(indexed_batch, dtype='long', padding='post'))
-        segments_tensors = torch.LongTensor(pad_sequences(segment_batch, dtype='long', padding='post'))
-        tokens_tensor = tokens_tensor.to('cuda')
-        segments_tensors = segments_tensors.to('cuda')
+        """
+        sentences are sorted by subword length and run in batches of batch_size, so each batch is padded
+        only to the longest of similar sentences
+        :return: [tokens, 3072] array of the last four layers for every sentence, in the order of sentences
+        """
+        return self.vectorize_tokenized([self.tokenize(sentence) for sentence in sentences])
 
-        with torch.no_grad():
-            encoded_layers, _ = self.model(tokens_tensor, segments_tensors)
+    def vectorize_tokenized(self, tokenized):
+        """
+        vectorize_sentences for sentences that are already passed through tokenize
+        """
+        order = np.argsort([len(ids) for ids, _, _ in tokenized], kind='stable')
+        result_batch = [None] * len(tokenized)
+        for start in range(0, len(order), self.batch_size):
+            indices = order[start:start + self.batch_size].tolist()
+            batch = [tokenized[i] for i in indices]
+            for i, vectors in zip(indices, self.vectorize_batch(batch)):
+                result_batch[i] = vectors
+        if self.device.type == 'cuda':
+            torch.cuda.empty_cache()
+        return result_batch
 
-        token_embeddings = torch.stack(encoded_layers, dim=0)
-        token_embeddings = token_embeddings[-4:, :, :, :].permute(1, 2, 0, 3)
-        token_embeddings = torch.flatten(token_embeddings, start_dim=2)
+    def vectorize_batch(self, batch):
+        length = max(len(ids) for ids, _, _ in batch)
+        tokens_tensor = torch.from_numpy(pad([ids for ids, _, _ in batch], length)).to(self.device)
+        segments_tensors = torch.from_numpy(pad([segments for _, segments, _ in batch], length)).to(self.device)
+        attention_mask = torch.from_numpy(pad([[1] * len(ids) for ids, _, _ in batch], length)).to(self.device)
 
-        for index, tensor in zip(mapping, token_embeddings):
-            result_batch.append(self.unmap_to_tokens(index, tensor))
-        torch.cuda.empty_cache()
-        return result_batch
+        with torch.no_grad():
+            encoded_layers, _ = self.model(tokens_tensor, segments_tensors, attention_mask)
+            token_embeddings = torch.cat(encoded_layers[-4:], dim=2)
+        # one copy to host memory for the whole batch
+        return segment_means(token_embeddings.cpu().numpy(), [mapping for _, _, mapping in batch])
 
     def tokenize(self, orig_tokens):
         tokenized_text = ["[CLS]"]
@@ -61,8 +113,4 @@ class BertPretrained:
         return indexed_tokens, segments_ids, orig_to_tok_map
 
     def unmap_to_tokens(self, mapping, tensor):
-        result = np.zeros((len(mapping) - 1, 3072))
-        for j, index in enumerate(mapping):
-            if j != len(mapping) - 1:
-                result[j] = torch.mean(tensor.cpu()[index:mapping[j + 1]], 0)
-        return result
+        return segment_means(tensor.cpu().numpy()[None], [mapping])[0]
@@ -1,8 +1,26 @@
 import numpy as np
 from gensim.models.fasttext import load_facebook_model
+from scipy.sparse import csr_matrix
 from string import punctuation
 
 
+def get_averaging_matrix(groups, index):
+    """
+    sparse [groups, tokens] matrix that maps token vectors to the mean over the texts of a group of the mean
+    vector of the text's tokens
+    :param groups: list of texts for every group, a text is a list of tokens
+    :param index: token -> column
+    """
+    rows, columns, weights = [], [], []
+    for row, texts in enumerate(groups):
+        for tokens in texts:
+            for token in tokens:
+                rows.append(row)
+                columns.append(index[token])
+                weights.append(1 / (len(tokens) * len(texts)))
+    return csr_matrix((weights, (rows, columns)), shape=(len(groups), len(index)))
+
+
 class FasttextVectorizer:
     def __init__(self, model_path):
         self.model = load_facebook_model(model_path)
@@ -17,19 +35,41 @@ class FasttextVectorizer:
         self.save_as_w2v(ids, vectors, output_path, to_upper)
 
     def __get_ruwordnet_vectors(self, synsets):
-        ids = []
-        vectors = np.zeros((len(synsets), self.model.vector_size))
-        for i, (_id, texts) in enumerate(synsets.items()):
-            ids.append(_id)
-            vectors[i, :] = self.__get_avg_vector(texts)
-        return ids, vectors
-
-    def __get_avg_vector(self, texts):
-        sum_vector = np.zeros(self.model.vector_size)
-        for text in texts:
-            words = [i.strip(punctuation) for i in text.split()]
-            sum_vector += np.sum(self.__get_data_vectors(words), axis=0)/len(words)
-        return sum_vector/len(texts)
+        ids = list(synsets)
+        groups = [[[i.strip(punctuation) for i in text.split()] for text in synsets[_id]] for _id in ids]
+        return ids, self.get_group_vectors(groups)
+
+    # -------------------------------------------------------------
+    # bulk lookups
+    # -------------------------------------------------------------
+
+    def get_token_vectors(self, tokens):
+        """
+        vectors of the distinct tokens, every token is looked up once: vocabulary words are gathered from
+        the vector matrix at once, out-of-vocabulary ones are composed from their n-grams by the model
+        :return: (token -> row, [distinct tokens, vector_size] matrix)
+        """
+        index = {}
+        for token in tokens:
+            index.setdefault(token, len(index))
+        wv = self.model.wv
+        vectors = np.zeros((len(index), self.model.vector_size), dtype=np.float32)
+        known = [(row, wv.vocab[token].index) for token, row in index.items() if token in wv.vocab]
+        if known:
+            rows, vocab_rows = zip(*known)
+            vectors[list(rows)] = wv.vectors[list(vocab_rows)]
+        for token, row in index.items():
+            if token not in wv.vocab:
+                vectors[row] = self.model[token]
+        return index, vectors
+
+    def get_group_vectors(self, groups):
+        """
+        for every group the mean over its texts of the mean vector of the text's tokens
+        :param groups: list of texts for every group, a text is a list of tokens
+        """
+        index, vectors = self.get_token_vectors(token for texts in groups for tokens in texts for token in tokens)
+        return np.asarray(get_averaging_matrix(groups, index) @ vectors, dtype=np.float64)
 
     # -------------------------------------------------------------
     # vectorize data
@@ -40,25 +80,20 @@ class FasttextVectorizer:
         self.save_as_w2v(data, data_vectors, output_path, to_upper)
 
     def __get_data_vectors(self, data):
-        vectors = np.zeros((len(data), self.model.vector_size))
-        for i, word in enumerate(data):
-            vectors[i, :] = self.model[word]
-        return vectors
+        index, vectors = self.get_token_vectors(data)
+        return vectors[[index[word] for word in data]].astype(np.float64).reshape(-1, self.model.vector_size)
 
     # -------------------------------------------------------------
     # vectorize multi-word data
     # -------------------------------------------------------------
 
     def vectorize_multiword_data(self, data, output_path, to_upper=True):
+        data = list(data)
         data_vectors = self.get_multiword_vectors(data)
         self.save_as_w2v(data, data_vectors, output_path, to_upper)
 
     def get_multiword_vectors(self, data):
-        vectors = np.zeros((len(data), self.model.vector_size))
-        for i, multi_word in enumerate(data):
-            words = multi_word.replace("_", " ").split()
-            vectors[i, :] = np.sum(self.__get_data_vectors(words), axis=0)/len(words)
-        return vectors
+        return self.get_group_vectors([[multi_word.replace("_", " ").split()] for multi_word in data])
 
     # -------------------------------------------------------------
     # save
@@ -1,6 +1,8 @@
 import numpy as np
 from numpy.linalg import norm
 
+from resources import get_projection
+
 
 class BaseVectorizer():
     def __init__(self, embeddings_model):
@@ -28,7 +30,7 @@ class ProjectionVectorizer(BaseVectorizer):
     """
     def __init__(self, embeddings_path, projection_path):
         super(ProjectionVectorizer, self).__init__(embeddings_path)
-        self.projection = np.loadtxt(projection_path, delimiter=',')
+        self.projection = get_projection(projection_path)
 
     def project_vec(self, src_vec):
         """
@@ -47,5 +49,5 @@ class ProjectionVectorizer(BaseVectorizer):
         """
         src_vec = self.model[src_word]
         predicted_vec = self.project_vec(src_vec)
-        nearest_neighbors = tar_emdedding_model.most_similar(positive=[predicted_vec], topn=topn)
+        nearest_neighbors = tar_emdedding_model.similar_by_vector(predicted_vec, topn=topn)
         return nearest_neighbors, predicted_vec
@@ -0,0 +1,153 @@
+import argparse
+import json
+import os
+import pickle
+import tempfile
+
+try:
+    # optional dependency: pip install pyahocorasick
+    import ahocorasick
+except ImportError:
+    # without it every word is searched in the joined meanings, which finds the same words, only slower
+    # for large entries
+    ahocorasick = None
+
+# separates the meanings of an entry in the joined string, it never occurs in taxonomy names
+MEANINGS_SEPARATOR = "\x00"
+# bumped whenever WiktionaryEntry changes, so that caches pickled by other versions are not read
+STORE_VERSION = 2
+# words * characters of meanings below which building an automaton costs more than searching every word:
+# measured break-even of pyahocorasick against the joined search is at 2.5e5 - 5e5
+MIN_AUTOMATON_SIZE = 250000
+
+
+def get_store_path(wiki_path):
+    return f"{wiki_path}.v{STORE_VERSION}.pickle"
+
+
+def find_substrings(patterns, text) -> set:
+    """
+    patterns that occur in text, found in one pass of an Aho-Corasick automaton when pyahocorasick is installed
+    and the search is large enough
+    """
+    # the empty pattern occurs in any text and cannot be added to an automaton
+    words = [pattern for pattern in patterns if pattern]
+    if ahocorasick is None or not words or len(patterns) * len(text) < MIN_AUTOMATON_SIZE:
+        return {pattern for pattern in patterns if pattern in text}
+    automaton = ahocorasick.Automaton()
+    for word in words:
+        automaton.add_word(word, word)
+    automaton.make_automaton()
+    return {word for _, word in automaton.iter(text)} | ({""} & set(patterns))
+
+
+class WiktionaryEntry:
+    """
+    hypernyms, synonyms and meanings of one wiktionary word prepared for feature lookups,
+    words passed to the lookups are expected in lower case
+    """
+    __slots__ = ("hypernyms", "hypernym_set", "synonym_set", "meanings", "n_meanings")
+
+    def __init__(self, hypernyms, synonyms, meanings):
+        self.hypernyms = hypernyms
+        # entries with upper case letters can never match a lowercased word
+        self.hypernym_set = frozenset(hypernym for hypernym in hypernyms if hypernym.lower() == hypernym)
+        self.synonym_set = frozenset(synonym for synonym in synonyms if synonym.lower() == synonym)
+        self.meanings = MEANINGS_SEPARATOR.join(meanings)
+        self.n_meanings = len(meanings)
+
+    def has_hypernym(self, word):
+        return word in self.hypernym_set
+
+    def has_synonym(self, word):
+        return word in self.synonym_set
+
+    def in_meanings(self, word):
+        """
+        whether word is a substring of any meaning
+        """
+        if self.n_meanings == 0:
+            return False
+        if MEANINGS_SEPARATOR in word:
+            return any(word in meaning for meaning in self.meanings.split(MEANINGS_SEPARATOR))
+        return word in self.meanings
+
+    def find_in_meanings(self, words) -> set:
+        """
+        words that are substrings of any meaning, searched for all at once
+        """
+        if self.n_meanings == 0:
+            return set()
+        found = find_substrings(set(words), self.meanings)
+        # words with the separator in them can be found across two meanings
+        return {word for word in found if MEANINGS_SEPARATOR not in word or self.in_meanings(word)}
+
+
+class WiktionaryStore:
+    """
+    wiktionary entries by word, parsed from the jsonlines dump once and cached next to it;
+    the cache is read by load or on first lookup
+    """
+    def __init__(self, wiki_path):
+        self.wiki_path = wiki_path
+        self.__entries = None
+
+    @staticmethod
+    def parse(wiki_path) -> dict:
+        entries = {}
+        with open(wiki_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                data = json.loads(line)
+                entries[data['word']] = WiktionaryEntry(data['hypernyms'], data['synonyms'], data['meanings'])
+        return entries
+
+    def build(self):
+        """
+        parses the dump and writes the cache under a temporary name before renaming it, so a concurrent or
+        interrupted run never leaves a truncated cache behind
+        """
+        self.__entries = self.parse(self.wiki_path)
+        store_path = get_store_path(self.wiki_path)
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(os.path.abspath(store_path)), suffix=".pickle",
+                                         delete=False) as f:
+            pickle.dump(self.__entries, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(f.name, store_path)
+        return self
+
+    def load(self):
+        """
+        reads the cache, or builds it when it is missing or older than the dump
+        """
+        store_path = get_store_path(self.wiki_path)
+        if os.path.exists(store_path) and os.path.getmtime(store_path) >= os.path.getmtime(self.wiki_path):
+            with open(store_path, 'rb') as f:
+                self.__entries = pickle.load(f)
+        else:
+            self.build()
+        return self
+
+    @property
+    def entries(self) -> dict:
+        if self.__entries is None:
+            self.load()
+        return self.__entries
+
+    def __contains__(self, word):
+        return word in self.entries
+
+    def __getitem__(self, word) -> WiktionaryEntry:
+        return self.entries[word]
+
+    def __len__(self):
+        return len(self.entries)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(prog='wiktionary store builder')
+    parser.add_argument('--wiki_path', type=str, dest="wiki_path", help='wiktionary jsonlines')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    # --wiki_path "models/wiktionary/wiktionary_ru.jsonlines"
+    WiktionaryStore(parse_args().wiki_path).build()
@@ -0,0 +1,93 @@
+import argparse
+import hashlib
+import json
+
+from taxonomy import TaxonomyFn
+from taxonomy_graph import TaxonomyGraph
+
+
+def build_wordnet_graph(wn, vocab, synsets=()):
+    """
+    WordNet restricted to the synset vocabulary, in the form the english taxonomy functions query it: hypernyms
+    and hyponyms of every synset that are in vocab, in WordNet order, and lemma names
+    :param wn: WordNetCorpusReader
+    :param vocab: synsets of the synset embeddings
+    :param synsets: other synsets that are looked up, e.g. the node2vec vocabulary
+    """
+    from nltk.corpus.reader.wordnet import WordNetError
+
+    vocab = set(vocab)
+    ids = []
+    hypernym_edges, hyponym_edges, senses = [], [], {}
+    for _id in sorted(vocab) + sorted(set(synsets) - vocab):
+        try:
+            synset = wn.synset(_id)
+        except (WordNetError, ValueError):
+            # left to WordNet, which raises the same error when the synset is looked up
+            continue
+        ids.append(_id)
+        hypernym_edges.extend((_id, hypernym.name()) for hypernym in synset.hypernyms() if hypernym.name() in vocab)
+        hyponym_edges.extend((_id, hyponym.name()) for hyponym in synset.hyponyms() if hyponym.name() in vocab)
+        senses[_id] = synset.lemma_names()
+    names = {_id: get_wordnet_name(_id) for _id in ids}
+    return TaxonomyGraph(ids, hypernym_edges, hyponym_edges, names, senses)
+
+
+def get_vocab_hash(vocab):
+    return hashlib.md5("\n".join(sorted(vocab)).encode('utf-8')).hexdigest()
+
+
+def get_wordnet_name(synset):
+    return synset.split(".")[0].replace("_", " ")
+
+
+def get_wordnet_graph_fns(graph_path, vectors_path, wordnet_path):
+    """
+    taxonomy functions of generate_taxonomy_fns answered from a graph of build_wordnet_graph; WordNet is read only
+    for synsets the graph is not built for, and loaded on the first of them
+    :param vectors_path: synset vectors, whose vocabulary filters the WordNet lookups
+    """
+    from resources import get_synset_vocab_hash, get_taxonomy_graph, get_vectors
+    graph = get_taxonomy_graph(graph_path)
+    if str(graph.arrays.get('vocab_hash')) != get_synset_vocab_hash(vectors_path):
+        raise Exception(f"{graph_path} is built for another synset vocabulary")
+    vocab = get_vectors(vectors_path).vocab
+    wordnet = []
+
+    def get_neighbours(relation, _id):
+        if _id in graph:
+            return graph.get_hypernyms(_id) if relation == "hypernyms" else graph.get_hyponyms(_id)
+        if not wordnet:
+            from nltk.corpus import WordNetCorpusReader
+            wordnet.append(WordNetCorpusReader(wordnet_path, None))
+        return [synset.name() for synset in getattr(wordnet[0].synset(_id), relation)() if synset.name() in vocab]
+
+    return TaxonomyFn(lambda x: get_neighbours("hypernyms", x)), TaxonomyFn(lambda x: get_neighbours("hyponyms", x)), \
+           TaxonomyFn(get_wordnet_name)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(prog='wordnet graph builder')
+    parser.add_argument('--config_path', type=str, dest="config_path", help='prediction config of an english run')
+    parser.add_argument('--output_path', type=str, dest="output_path",
+                        help='output .npz path, defaults to wordnet_graph_path of the config')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    # --config_path "configs/ranked_en.json" --output_path "models/taxonomy/wordnet_nouns.npz"
+    from gensim.models.poincare import PoincareKeyedVectors
+    from nltk.corpus import WordNetCorpusReader
+    from resources import get_vectors
+
+    args = parse_args()
+    with open(args.config_path, 'r', encoding='utf-8') as j:
+        params = json.load(j)
+    wn = WordNetCorpusReader(params["ruwordnet_path"], None)
+    vocab = get_vectors(params["synsets_vectors_path"]).vocab
+    # candidates of the node2vec and poincare models are looked up as well
+    synsets = list(get_vectors(params["node2vec_path"]).index2word) if "node2vec_path" in params else []
+    if "poincare_path" in params:
+        synsets += get_vectors(params["poincare_path"], PoincareKeyedVectors).index2word
+    graph = build_wordnet_graph(wn, vocab, synsets)
+    graph.save(args.output_path or params["wordnet_graph_path"], vocab_hash=get_vocab_hash(vocab))
@@ -3,6 +3,7 @@ import argparse
 import os
 import sys
 
+from scoring_program.scoring import get_scores, mean, save_word_scores
 from scoring_program.utils import get_submitted, get_reference
 
 
@@ -13,6 +14,7 @@ def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('input_dir')
     parser.add_argument('output_dir')
+    parser.add_argument('--word_scores', action='store_true', help='also write per-word scores to word_scores.txt')
     args = parser.parse_args()
 
     output_dir = sys.argv[2]
@@ -38,8 +40,10 @@ def main():
             raise Exception("Reference and Submitted files have no samples in common")
         elif set(true) != set(submitted):
             print("Not all words are presented in your file")
-        mean_ap, mean_rr = get_score(true, submitted, 10)
-        output_file.write("map: {0}\nmrr: {1}\n".format(mean_ap, mean_rr))
+        ap, rr = get_scores(true, submitted, 10)
+        output_file.write("map: {0}\nmrr: {1}\n".format(mean(ap), mean(rr)))
+        if args.word_scores:
+            save_word_scores(os.path.join(output_dir, 'word_scores.txt'), list(true), ap, rr)
 
 
 def get_score(true, predicted, k=10):
@@ -0,0 +1,158 @@
+import argparse
+import os
+
+import numpy as np
+
+from scoring_program.utils import read_dataset, read_reference, get_reference_file
+
+
+class EncodedReference(object):
+    """
+    reference hypernym groups encoded as integer arrays, so that predictions for all words are scored at once
+    with the same AP@k and RR@k as compute_ap and compute_rr
+    """
+    def __init__(self, true, k=10):
+        self.k = k
+        self.words = list(true)
+        self.ids = {}
+        word_index, group_index, synsets = [], [], []
+        self.n_groups = np.zeros(len(self.words), dtype=np.int64)
+        for w, word in enumerate(self.words):
+            groups = true[word]
+            self.n_groups[w] = len(groups)
+            for g, group in enumerate(groups):
+                for synset in group:
+                    word_index.append(w)
+                    group_index.append(g)
+                    synsets.append(self.ids.setdefault(synset, len(self.ids)))
+        self.max_groups = max(int(self.n_groups.max()) if len(self.words) else 0, 1)
+        keys = np.array(word_index, dtype=np.int64) * len(self.ids) + np.array(synsets, dtype=np.int64)
+        order = np.argsort(keys, kind='stable')
+        self.keys = keys[order]
+        self.groups = np.array(group_index, dtype=np.int64)[order]
+
+    def encode(self, predicted):
+        """
+        :return: [words, k] matrix of synset numbers of the first k predictions, -1 for padding and unknown synsets
+        """
+        encoded = np.full((len(self.words), self.k), -1, dtype=np.int64)
+        for w, word in enumerate(self.words):
+            for i, synset in enumerate(predicted.get(word, [])[:self.k]):
+                encoded[w, i] = self.ids.get(synset, -1)
+        return encoded
+
+    def membership(self, encoded):
+        """
+        :return: [words, k, groups] boolean tensor, whether prediction i of a word belongs to its group g
+        """
+        words = np.repeat(np.arange(len(self.words), dtype=np.int64), self.k)
+        synsets = encoded.ravel()
+        keys = np.where(synsets >= 0, words * len(self.ids) + synsets, -1)
+        start = np.searchsorted(self.keys, keys, side='left')
+        end = np.searchsorted(self.keys, keys, side='right')
+        end[keys < 0] = start[keys < 0]
+        counts = end - start
+        positions = np.repeat(np.arange(len(keys)), counts)
+        entries = np.repeat(start - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+        member = np.zeros((len(keys), self.max_groups), dtype=bool)
+        member[positions, self.groups[entries]] = True
+        return member.reshape(len(self.words), self.k, self.max_groups)
+
+    def score(self, predicted):
+        """
+        :return: AP@k and RR@k of every word in the order of self.words
+        """
+        return self.score_encoded(self.encode(predicted))
+
+    def score_encoded(self, encoded):
+        """
+        score of predictions that are already encoded, e.g. ranked as arrays over the synset numbers of self.ids
+        """
+        member = self.membership(encoded)
+        n_words = len(self.words)
+        rows = np.arange(n_words)
+        consumed = np.zeros((n_words, self.max_groups), dtype=bool)
+        score = np.zeros(n_words)
+        hits = np.zeros(n_words)
+        skipped = np.zeros(n_words)
+        rr = np.zeros(n_words)
+        for i in range(self.k):
+            in_groups = member[:, i]
+            found = in_groups.any(1)
+            rr = np.where((rr == 0) & found, 1.0 / (i + 1.0), rr)
+            # a prediction from an already matched group does not take a position
+            skip = (in_groups & consumed).any(1)
+            hit = found & ~skip
+            hits += hit
+            score = np.where(hit, score + hits / (i + 1.0 - skipped), score)
+            consumed[rows[hit], np.argmax(in_groups[hit], axis=1)] = True
+            skipped += skip
+        ap = np.where(self.n_groups > 0, score / np.maximum(np.minimum(self.n_groups, self.k), 1), 0.0)
+        return ap, rr
+
+
+def mean(scores):
+    # summed in order, as a running total would be
+    return float(np.cumsum(scores)[-1]) / len(scores)
+
+
+def get_scores(true, predicted, k=10):
+    """
+    :return: per-word AP@k and RR@k in the order of true
+    """
+    return EncodedReference(true, k).score(predicted)
+
+
+def evaluate_many(true, submissions, k=10):
+    """
+    scores many submissions against one reference, which is encoded once
+    :param submissions: dict name -> predictions
+    :return: dict name -> (map, mrr, per-word ap, per-word rr)
+    """
+    reference = EncodedReference(true, k)
+    results = {}
+    for name, predicted in submissions.items():
+        ap, rr = reference.score(predicted)
+        results[name] = (mean(ap), mean(rr), ap, rr)
+    return results
+
+
+def evaluate_predictions(true, predicted, k=10):
+    """
+    MAP and MRR of predictions kept in memory, e.g. the dict returned by predict_hypernyms
+    :param true: reference dict or path to the reference file
+    """
+    if isinstance(true, str):
+        true = read_reference(true)
+    ap, rr = get_scores(true, predicted, k)
+    return mean(ap), mean(rr)
+
+
+def save_word_scores(path, words, ap, rr):
+    with open(path, 'w', encoding='utf-8') as f:
+        for word, word_ap, word_rr in zip(words, ap.tolist(), rr.tolist()):
+            f.write("{0}\t{1}\t{2}\n".format(word, word_ap, word_rr))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('reference', help='reference .tsv file or directory with it')
+    parser.add_argument('submissions', nargs='+', help='submitted .tsv files')
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--word_scores_dir', help='directory for per-word scores of every submission')
+    args = parser.parse_args()
+
+    reference_path = get_reference_file(args.reference) if os.path.isdir(args.reference) else args.reference
+    true = read_reference(reference_path)
+    submissions = {path: read_dataset(path) for path in args.submissions}
+    results = evaluate_many(true, submissions, args.k)
+    if args.word_scores_dir and not os.path.exists(args.word_scores_dir):
+        os.makedirs(args.word_scores_dir)
+    for path, (mean_ap, mean_rr, ap, rr) in results.items():
+        print("{0}\tmap: {1}\tmrr: {2}".format(path, mean_ap, mean_rr))
+        if args.word_scores_dir:
+            save_word_scores(os.path.join(args.word_scores_dir, os.path.basename(path)), list(true), ap, rr)
+
+
+if __name__ == '__main__':
+    main()
@@ -24,11 +24,19 @@ def get_submitted(parent):
     return read_dataset(os.path.join(parent, names[0]))
 
 
-def get_reference(parent):
+def get_reference_file(parent):
     names = [os.path.join(parent, name) for name in os.listdir(parent) if (name.endswith('.tsv') or name.endswith('.csv'))]
     if len(names) == 0:
         raise RuntimeError('No .csv or .tsv files in reference')
     if len(names) != 1:
         raise RuntimeError('There should be exact one file in reference: {}'.format(' '.join(names)))
+    return names[0]
+
+
+def read_reference(data_path):
     read_fn = lambda x: json.loads(x)
-    return read_dataset(names[0], read_fn)
+    return read_dataset(data_path, read_fn)
+
+
+def get_reference(parent):
+    return read_reference(get_reference_file(parent))
@@ -1,33 +1,96 @@
-import networkx as nx
+import os
+import tempfile
+
+import numpy as np
+
+
+def build_csr(sources, targets, size):
+    """
+    same as taxonomy_graph.build_csr of the baselines, kept here so that this module imports on its own
+    :return: (indptr, indices) so that neighbours of node i are indices[indptr[i]:indptr[i + 1]], in edge order
+    """
+    order = np.argsort(sources, kind='stable')
+    indptr = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=size), out=indptr[1:])
+    return indptr, np.asarray(targets, dtype=np.int32)[order]
 
 
 class SemEvalTaxonomy:
-    def __init__(self, taxonomy_path, use_underscore=True):
+    """
+    .taxo graph with terms interned to ints and parent / child lists in CSR arrays, neighbours keep the order of
+    the edges in the file; the parsed graph is cached in <taxonomy_path>.npz next to the file
+    """
+    def __init__(self, taxonomy_path, use_underscore=True, cache=True):
+        """
+        :param cache: read the graph from the cache file when it is up to date and write it otherwise
+        """
         self.use_underscore = use_underscore
-        self.G = self.create_taxonomy(taxonomy_path)
+        self.terms, self.parents, self.children = self.load_taxonomy(taxonomy_path, cache)
+        self.index = {term: i for i, term in enumerate(self.terms)}
+
+    def load_taxonomy(self, taxonomy_path, cache=True):
+        cache_path = taxonomy_path + ".npz"
+        stat = os.stat(taxonomy_path)
+        source = np.array([stat.st_size, stat.st_mtime_ns, self.use_underscore], dtype=np.int64)
+        if cache and os.path.exists(cache_path):
+            graph = np.load(cache_path)
+            if np.array_equal(graph['source'], source):
+                return graph['terms'].tolist(), (graph['parents_indptr'], graph['parents_indices']), \
+                       (graph['children_indptr'], graph['children_indices'])
+        terms, parents, children = self.create_taxonomy(taxonomy_path)
+        if cache:
+            try:
+                # a temporary file of this process, concurrent runs each write their own and the last rename wins
+                with tempfile.NamedTemporaryFile(dir=os.path.dirname(os.path.abspath(cache_path)), suffix=".npz",
+                                                 delete=False) as f:
+                    np.savez(f, source=source, terms=np.array(terms, dtype=str),
+                             parents_indptr=parents[0], parents_indices=parents[1],
+                             children_indptr=children[0], children_indices=children[1])
+                os.replace(f.name, cache_path)
+            except OSError:
+                # read-only data directories are parsed on every run
+                pass
+        return terms, parents, children
 
     def create_taxonomy(self, taxonomy_path):
-        G = nx.DiGraph()
+        """
+        :return: terms in order of first appearance, parents and children CSR; repeated edges are kept once
+        """
+        index = {}
+        edges = {}
         with open(taxonomy_path, 'r', encoding='utf-8') as f:
             for line in f:
                 child, parent = line.strip().split("\t")[1:]
                 if self.use_underscore:
                     child, parent = child.replace(" ", "_"), parent.replace(" ", "_")
-                G.add_edge(child, parent)
-        return G
+                edges.setdefault((index.setdefault(child, len(index)), index.setdefault(parent, len(index))))
+        edges = np.array(list(edges), dtype=np.int64).reshape(-1, 2)
+        return list(index), build_csr(edges[:, 0], edges[:, 1], len(index)), \
+               build_csr(edges[:, 1], edges[:, 0], len(index))
 
-    def get_hypernym(self, word):
+    def __neighbours(self, csr, word):
         if self.use_underscore:
             word = word.replace(" ", "_")
-        return [i for i in self.G.neighbors(word)]
+        i = self.index.get(word)
+        if i is None:
+            raise Exception(f"The node {word} is not in the digraph.")
+        indptr, indices = csr
+        return [self.terms[j] for j in indices[indptr[i]:indptr[i + 1]].tolist()]
+
+    def get_hypernym(self, word):
+        return self.__neighbours(self.parents, word)
 
     def get_hyponym(self, word):
-        if self.use_underscore:
-            word = word.replace(" ", "_")
-        return [i for i in self.G.predecessors(word)]
+        return self.__neighbours(self.children, word)
+
+    def get_hypernyms_many(self, words) -> list:
+        return [self.get_hypernym(word) for word in words]
+
+    def get_hyponyms_many(self, words) -> list:
+        return [self.get_hyponym(word) for word in words]
 
     def get_nodes(self):
-        return self.G.nodes
+        return self.terms
 
 
 if __name__ == '__main__':